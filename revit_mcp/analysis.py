@@ -4,9 +4,13 @@ Analysis Module for Revit MCP
 Handles element filtering, room data, material quantities, and model statistics
 """
 
-from utils import get_element_name, normalize_string, get_element_id_value
+from utils import (
+    get_element_name, normalize_string, get_element_id_value, json_loads,
+    document_cache, register_document_cache, BUILTIN_CATEGORIES,
+)
 from pyrevit import routes, revit, DB
-import json
+from System.Collections.Generic import List
+from collections import Counter, defaultdict
 import traceback
 import logging
 
@@ -17,6 +21,105 @@ SQFT_TO_SQM = 0.0929
 CUFT_TO_CUM = 0.0283168
 
 
+def _builtin_params(*names):
+    """Resolve BuiltInParameter names, skipping any missing from this Revit version."""
+    return tuple(
+        getattr(DB.BuiltInParameter, name)
+        for name in names
+        if hasattr(DB.BuiltInParameter, name)
+    )
+
+
+# Checked in order; the first parameter with a value wins
+LENGTH_BIPS = _builtin_params("CURVE_ELEM_LENGTH", "INSTANCE_LENGTH_PARAM")
+HEIGHT_BIPS = _builtin_params(
+    "INSTANCE_HEIGHT_PARAM", "WALL_USER_HEIGHT_PARAM", "INSTANCE_FREE_HEIGHT_PARAM"
+)
+
+
+# (response key, parameter, kind) read for every room in export_room_data_handler
+ROOM_FIELDS = (
+    ("name", DB.BuiltInParameter.ROOM_NAME, "str"),
+    ("number", DB.BuiltInParameter.ROOM_NUMBER, "str"),
+    ("department", DB.BuiltInParameter.ROOM_DEPARTMENT, "str"),
+    ("area_sqm", DB.BuiltInParameter.ROOM_AREA, "area"),
+    ("perimeter_mm", DB.BuiltInParameter.ROOM_PERIMETER, "len"),
+)
+
+
+def _safe_param(elem, bip):
+    """Return elem's BuiltInParameter if it exists and has a value, else None. Never raises."""
+    try:
+        param = elem.get_Parameter(bip)
+        return param if param and param.HasValue else None
+    except Exception:
+        return None
+
+
+def _first_param_double(elem, bips):
+    """Return AsDouble() of the first BuiltInParameter in bips that has a value, else None."""
+    for bip in bips:
+        param = _safe_param(elem, bip)
+        if param:
+            return param.AsDouble()
+    return None
+
+
+def _element_name_resolver(doc):
+    """
+    Return a function mapping an ElementId to its element's name ("" if missing).
+    Results are memoized for the lifetime of the returned function, so resolving
+    the level or type shared by thousands of elements costs one GetElement call.
+    """
+    cache = {}
+
+    def _resolve(element_id):
+        key = get_element_id_value(element_id)
+        name = cache.get(key)
+        if name is None:
+            element = doc.GetElement(element_id)
+            name = get_element_name(element) if element else ""
+            cache[key] = name
+        return name
+
+    return _resolve
+
+
+def _type_name_contains_filter(type_name):
+    """
+    Build an ElementParameterFilter matching elements whose type name contains type_name.
+    Uses the case-insensitive two-argument CreateContainsRule (Revit 2023+) and
+    falls back to the older overload taking a caseSensitive flag.
+    """
+    param_id = DB.ElementId(DB.BuiltInParameter.ALL_MODEL_TYPE_NAME)
+    try:
+        rule = DB.ParameterFilterRuleFactory.CreateContainsRule(param_id, type_name)
+    except TypeError:
+        rule = DB.ParameterFilterRuleFactory.CreateContainsRule(param_id, type_name, False)
+    return DB.ElementParameterFilter(rule)
+
+
+# Built-in model category ids per document (see utils.document_cache); they
+# only go away with the document, so no change filter is needed
+register_document_cache("model_category_ids")
+
+
+def _model_category_filter(doc):
+    """Return an ElementMulticategoryFilter over the document's built-in model categories."""
+    def build(d):
+        ids = []
+        for cat in d.Settings.Categories:
+            try:
+                if cat.CategoryType == DB.CategoryType.Model and get_element_id_value(cat.Id) < 0:
+                    ids.append(cat.Id)
+            except Exception:
+                continue
+        return ids, set()
+
+    ids = document_cache(doc, "model_category_ids", build)
+    return DB.ElementMulticategoryFilter(List[DB.ElementId](ids))
+
+
 def register_analysis_routes(api):
     """Register all analysis routes with the API"""
 
@@ -31,13 +134,14 @@ def register_analysis_routes(api):
 
             data = {}
             if request and request.data:
-                data = json.loads(request.data) if isinstance(request.data, str) else request.data
+                data = json_loads(request.data) if isinstance(request.data, str) else request.data
 
             category = data.get("category")
             type_name = data.get("type_name")
             visible_in_view = data.get("visible_in_view", False)
             bbox_min = data.get("bounding_box_min")
             bbox_max = data.get("bounding_box_max")
+            strict_bbox = data.get("strict_bounding_box", False)
             max_elements = data.get("max_elements", 50)
 
             # Start with collector
@@ -58,20 +162,10 @@ def register_analysis_routes(api):
             else:
                 collector = DB.FilteredElementCollector(doc)
 
-            # Apply category filter
-            if category:
-                try:
-                    bic = getattr(DB.BuiltInCategory, category)
-                    collector = collector.OfCategory(bic)
-                except AttributeError:
-                    return routes.make_response(
-                        data={"error": "Invalid category: {}. Use BuiltInCategory names like OST_Walls, OST_Doors".format(category)},
-                        status=400,
-                    )
-
-            collector = collector.WhereElementIsNotElementType()
-
-            # Apply bounding box filter
+            # Apply the bounding box filter first so the spatial quick filter
+            # narrows the set before the category filter. Strict mode uses the
+            # inside filter alone: inside implies intersects, so and-ing it with
+            # the intersects filter would give the same result
             if bbox_min and bbox_max:
                 try:
                     min_pt = DB.XYZ(
@@ -85,82 +179,102 @@ def register_analysis_routes(api):
                         float(bbox_max.get("z", 0)) * MM_TO_FEET,
                     )
                     outline = DB.Outline(min_pt, max_pt)
-                    bb_filter = DB.BoundingBoxIntersectsFilter(outline)
+                    if strict_bbox:
+                        bb_filter = DB.BoundingBoxIsInsideFilter(outline)
+                    else:
+                        bb_filter = DB.BoundingBoxIntersectsFilter(outline)
                     collector = collector.WherePasses(bb_filter)
                 except Exception as bb_err:
                     logger.warning("Bounding box filter failed: {}".format(str(bb_err)))
 
-            all_elements = collector.ToElements()
+            # Apply category filter
+            if category:
+                bic = BUILTIN_CATEGORIES.get(category)
+                if bic is None:
+                    return routes.make_response(
+                        data={"error": "Invalid category: {}. Use BuiltInCategory names like OST_Walls, OST_Doors".format(category)},
+                        status=400,
+                    )
+                collector = collector.OfCategory(bic)
+
+            # Instances only (inverted ElementIsElementTypeFilter)
+            collector = collector.WherePasses(DB.ElementIsElementTypeFilter(True))
 
-            # Apply type name filter (partial match)
+            # Apply type name filter natively; fall back to a Python-side scan
+            # if the parameter rule cannot be built
+            type_name_lower = None
+            if type_name:
+                try:
+                    collector = collector.WherePasses(_type_name_contains_filter(type_name))
+                except Exception as rule_err:
+                    logger.warning("Type name filter rule failed: {}".format(str(rule_err)))
+                    type_name_lower = type_name.lower()
+
+            # Count natively, then iterate lazily so only up to max_elements
+            # elements are marshalled into Python
+            total_matched = collector.GetElementCount()
+
+            # Local bindings for the per-element loop
+            resolve_name = _element_name_resolver(doc)
+            _name = get_element_name
+            _id = get_element_id_value
+            _first = _first_param_double
+            _round = round
+            invalid_id = DB.ElementId.InvalidElementId
+            feet_to_mm = 1.0 / MM_TO_FEET
+
+            # Python fallback type name filter (partial match)
             elements = []
-            for elem in all_elements:
+            append = elements.append
+            for elem in collector:
                 if len(elements) >= max_elements:
                     break
 
-                if type_name:
+                if type_name_lower:
                     try:
-                        elem_type_name = get_element_name(elem)
-                        if type_name.lower() not in elem_type_name.lower():
+                        if type_name_lower not in _name(elem).lower():
                             # Also check the type element
                             type_id = elem.GetTypeId()
-                            if type_id and type_id != DB.ElementId.InvalidElementId:
-                                type_elem = doc.GetElement(type_id)
-                                if type_elem:
-                                    full_type = get_element_name(type_elem)
-                                    if type_name.lower() not in full_type.lower():
-                                        continue
-                                else:
-                                    continue
-                            else:
+                            if not type_id or type_id == invalid_id:
+                                continue
+                            if type_name_lower not in resolve_name(type_id).lower():
                                 continue
                     except Exception:
                         continue
 
                 # Build element info
                 elem_info = {
-                    "id": get_element_id_value(elem),
+                    "id": _id(elem),
                     "category": elem.Category.Name if elem.Category else "Unknown",
-                    "type": get_element_name(elem),
+                    "type": _name(elem),
                 }
 
                 # Get level
                 try:
                     level_id = elem.LevelId
-                    if level_id and level_id != DB.ElementId.InvalidElementId:
-                        level = doc.GetElement(level_id)
-                        if level:
-                            elem_info["level"] = get_element_name(level)
+                    if level_id and level_id != invalid_id:
+                        level_name = resolve_name(level_id)
+                        if level_name:
+                            elem_info["level"] = level_name
                 except Exception:
                     pass
 
                 # Get dimensions if available
-                try:
-                    length_param = elem.LookupParameter("Length")
-                    if length_param and length_param.HasValue:
-                        elem_info["length_mm"] = round(length_param.AsDouble() / MM_TO_FEET, 0)
-                except Exception:
-                    pass
+                length = _first(elem, LENGTH_BIPS)
+                if length is not None:
+                    elem_info["length_mm"] = _round(length * feet_to_mm, 0)
 
-                try:
-                    height_param = elem.LookupParameter("Height")
-                    if not height_param:
-                        height_param = elem.LookupParameter("Unconnected Height")
-                    if height_param and height_param.HasValue:
-                        elem_info["height_mm"] = round(height_param.AsDouble() / MM_TO_FEET, 0)
-                except Exception:
-                    pass
+                height = _first(elem, HEIGHT_BIPS)
+                if height is not None:
+                    elem_info["height_mm"] = _round(height * feet_to_mm, 0)
 
-                elements.append(elem_info)
+                append(elem_info)
 
-            total_matched = len(all_elements)
             count = len(elements)
 
             cat_label = category.replace("OST_", "").lower() if category else "element"
-            message = "Found {} {}{} matching filters".format(
-                total_matched,
-                cat_label,
-                "s" if total_matched != 1 else "",
+            message = "Found %d %s%s matching filters" % (
+                total_matched, cat_label, "s"[:total_matched != 1]
             )
 
             return routes.make_response(
@@ -196,6 +310,14 @@ def register_analysis_routes(api):
                 .ToElements()
             )
 
+            # Local bindings for the per-room loop
+            level_name_of = _element_name_resolver(doc)
+            _safe = _safe_param
+            _normalize = normalize_string
+            _round = round
+            sqft_to_sqm = SQFT_TO_SQM
+            feet_to_mm = 1.0 / MM_TO_FEET
+
             rooms = []
             for room in rooms_collector:
                 try:
@@ -213,55 +335,22 @@ def register_analysis_routes(api):
                         "department": "",
                     }
 
-                    # Get name
-                    try:
-                        name_param = room.get_Parameter(DB.BuiltInParameter.ROOM_NAME)
-                        if name_param:
-                            room_info["name"] = normalize_string(name_param.AsString() or "")
-                    except Exception:
-                        room_info["name"] = get_element_name(room)
-
-                    # Get number
-                    try:
-                        number_param = room.get_Parameter(DB.BuiltInParameter.ROOM_NUMBER)
-                        if number_param:
-                            room_info["number"] = normalize_string(number_param.AsString() or "")
-                    except Exception:
-                        pass
-
-                    # Get level
-                    try:
-                        level_id = room.LevelId
-                        if level_id and level_id != DB.ElementId.InvalidElementId:
-                            level = doc.GetElement(level_id)
-                            if level:
-                                room_info["level"] = get_element_name(level)
-                    except Exception:
-                        pass
-
-                    # Get area (convert sq feet to sq meters)
-                    try:
-                        area_param = room.get_Parameter(DB.BuiltInParameter.ROOM_AREA)
-                        if area_param and area_param.HasValue:
-                            room_info["area_sqm"] = round(area_param.AsDouble() * SQFT_TO_SQM, 2)
-                    except Exception:
-                        pass
-
-                    # Get perimeter (convert feet to mm)
-                    try:
-                        perim_param = room.get_Parameter(DB.BuiltInParameter.ROOM_PERIMETER)
-                        if perim_param and perim_param.HasValue:
-                            room_info["perimeter_mm"] = round(perim_param.AsDouble() / MM_TO_FEET, 0)
-                    except Exception:
-                        pass
-
-                    # Get department
-                    try:
-                        dept_param = room.get_Parameter(DB.BuiltInParameter.ROOM_DEPARTMENT)
-                        if dept_param:
-                            room_info["department"] = normalize_string(dept_param.AsString() or "")
-                    except Exception:
-                        pass
+                    for key, bip, kind in ROOM_FIELDS:
+                        param = _safe(room, bip)
+                        if not param:
+                            continue
+                        if kind == "str":
+                            room_info[key] = _normalize(param.AsString() or "")
+                        elif kind == "area":
+                            # sq feet to sq meters
+                            room_info[key] = _round(param.AsDouble() * sqft_to_sqm, 2)
+                        else:
+                            # feet to mm
+                            room_info[key] = _round(param.AsDouble() * feet_to_mm, 0)
+
+                    level_id = room.LevelId
+                    if level_id and level_id != DB.ElementId.InvalidElementId:
+                        room_info["level"] = level_name_of(level_id)
 
                     rooms.append(room_info)
 
@@ -270,10 +359,7 @@ def register_analysis_routes(api):
                     continue
 
             count = len(rooms)
-            message = "Exported data for {} room{}".format(
-                count,
-                "s" if count != 1 else ""
-            )
+            message = "Exported data for %d room%s" % (count, "s"[:count != 1])
 
             return routes.make_response(
                 data={
@@ -302,7 +388,7 @@ def register_analysis_routes(api):
 
             data = {}
             if request and request.data:
-                data = json.loads(request.data) if isinstance(request.data, str) else request.data
+                data = json_loads(request.data) if isinstance(request.data, str) else request.data
 
             categories_filter = data.get("categories")
 
@@ -310,11 +396,11 @@ def register_analysis_routes(api):
             target_categories = []
             if categories_filter:
                 for cat_str in categories_filter:
-                    try:
-                        bic = getattr(DB.BuiltInCategory, cat_str)
-                        target_categories.append(bic)
-                    except AttributeError:
+                    bic = BUILTIN_CATEGORIES.get(cat_str)
+                    if bic is None:
                         logger.warning("Invalid category: {}".format(cat_str))
+                    else:
+                        target_categories.append(bic)
             else:
                 # Default categories with materials
                 target_categories = [
@@ -327,75 +413,110 @@ def register_analysis_routes(api):
                 ]
 
             # Aggregate materials
-            material_data = {}  # material_name -> {area, volume, count}
+            material_data = defaultdict(lambda: [0.0, 0.0, 0])  # material_name -> [area_sqft, volume_cuft, count]
+            mat_name_cache = {}  # material id value -> name ("" if unresolved)
 
-            for bic in target_categories:
+            # Scan all target categories in a single collector pass
+            elements = []
+            if target_categories:
                 try:
+                    category_ids = List[DB.ElementId]([DB.ElementId(bic) for bic in target_categories])
                     elements = (
                         DB.FilteredElementCollector(doc)
-                        .OfCategory(bic)
+                        .WherePasses(DB.ElementMulticategoryFilter(category_ids))
                         .WhereElementIsNotElementType()
                         .ToElements()
                     )
+                except Exception as cat_err:
+                    logger.warning("Could not collect categories: {}".format(str(cat_err)))
+
+            def _named_materials(mat_ids):
+                """Pair each material id with its cached name, dropping unresolved ones."""
+                pairs = []
+                for mat_id in mat_ids or ():
+                    mat_key = get_element_id_value(mat_id)
+                    mat_name = mat_name_cache.get(mat_key)
+                    if mat_name is None:
+                        mat = doc.GetElement(mat_id)
+                        if mat:
+                            mat_name = get_element_name(mat) or "Unknown Material"
+                        else:
+                            mat_name = ""
+                        mat_name_cache[mat_key] = mat_name
+                    if mat_name:
+                        pairs.append((mat_id, mat_name))
+                return tuple(pairs)
+
+            def _layered_host(elem):
+                """
+                True for host objects whose materials all come from their type's
+                compound structure. Curtain and stacked walls take panel,
+                mullion and sub-wall types per instance, so they are excluded.
+                """
+                if isinstance(elem, DB.Wall) and elem.WallType.Kind != DB.WallKind.Basic:
+                    return False
+                host_type = doc.GetElement(elem.GetTypeId())
+                try:
+                    return host_type is not None and host_type.GetCompoundStructure() is not None
+                except Exception:
+                    return False
 
-                    for elem in elements:
-                        try:
-                            mat_ids = elem.GetMaterialIds(False)
-                            if not mat_ids:
-                                continue
+            # Layered host objects (basic walls, floors, roofs, ceilings) are
+            # resolved once per type; everything else, including family
+            # instances that can override materials, is resolved per instance.
+            type_materials = {}  # layered host type id value -> ((mat_id, name), ...)
+            per_instance_types = set()  # host type id values that are not layered
+
+            for elem in elements:
+                try:
+                    elem_materials = None
+                    if isinstance(elem, DB.HostObject):
+                        type_key = get_element_id_value(elem.GetTypeId())
+                        elem_materials = type_materials.get(type_key)
+                        if elem_materials is None and type_key not in per_instance_types:
+                            if _layered_host(elem):
+                                elem_materials = _named_materials(elem.GetMaterialIds(False))
+                                type_materials[type_key] = elem_materials
+                            else:
+                                per_instance_types.add(type_key)
+                    if elem_materials is None:
+                        elem_materials = _named_materials(elem.GetMaterialIds(False))
+
+                    for mat_id, mat_name in elem_materials:
+                        bucket = material_data[mat_name]
 
-                            for mat_id in mat_ids:
-                                mat = doc.GetElement(mat_id)
-                                if not mat:
-                                    continue
-
-                                mat_name = get_element_name(mat)
-                                if not mat_name:
-                                    mat_name = "Unknown Material"
-
-                                if mat_name not in material_data:
-                                    material_data[mat_name] = {
-                                        "area_sqft": 0.0,
-                                        "volume_cuft": 0.0,
-                                        "element_count": 0,
-                                    }
-
-                                # Get material area
-                                try:
-                                    area = elem.GetMaterialArea(mat_id, False)
-                                    material_data[mat_name]["area_sqft"] += area
-                                except Exception:
-                                    pass
-
-                                # Get material volume
-                                try:
-                                    volume = elem.GetMaterialVolume(mat_id)
-                                    material_data[mat_name]["volume_cuft"] += volume
-                                except Exception:
-                                    pass
-
-                                material_data[mat_name]["element_count"] += 1
+                        # Get material area
+                        try:
+                            area = elem.GetMaterialArea(mat_id, False)
+                            bucket[0] += area
+                        except Exception:
+                            pass
 
+                        # Get material volume
+                        try:
+                            volume = elem.GetMaterialVolume(mat_id)
+                            bucket[1] += volume
                         except Exception:
-                            continue
+                            pass
 
-                except Exception as cat_err:
-                    logger.warning("Could not process category: {}".format(str(cat_err)))
+                        bucket[2] += 1
+
+                except Exception:
+                    continue
 
             # Convert to response format
             materials = []
-            for name, data_vals in sorted(material_data.items()):
+            for name, (area_sqft, volume_cuft, element_count) in sorted(material_data.items()):
                 materials.append({
                     "name": name,
-                    "area_sqm": round(data_vals["area_sqft"] * SQFT_TO_SQM, 2),
-                    "volume_cum": round(data_vals["volume_cuft"] * CUFT_TO_CUM, 3),
-                    "element_count": data_vals["element_count"],
+                    "area_sqm": round(area_sqft * SQFT_TO_SQM, 2),
+                    "volume_cum": round(volume_cuft * CUFT_TO_CUM, 3),
+                    "element_count": element_count,
                 })
 
             total = len(materials)
-            message = "Material quantities from {} material{} across all categories".format(
-                total,
-                "s" if total != 1 else ""
+            message = "Material quantities from %d material%s across all categories" % (
+                total, "s"[:total != 1]
             )
 
             return routes.make_response(
@@ -423,56 +544,45 @@ def register_analysis_routes(api):
                     data={"error": "No active Revit document"}, status=503
                 )
 
-            # Get all model elements (exclude types, views, annotations where possible)
+            # Get model-category instances only; non-model elements are
+            # rejected by the collector and never reach Python
             all_elements = (
                 DB.FilteredElementCollector(doc)
+                .WherePasses(_model_category_filter(doc))
                 .WhereElementIsNotElementType()
                 .ToElements()
             )
 
-            category_counts = {}
-            total = 0
-
+            # Count by category id; names are resolved once per category
+            counts_by_id = Counter()
+            id_to_name = {}
+            _id = get_element_id_value
             for elem in all_elements:
                 try:
-                    if not elem.Category:
+                    cat = elem.Category
+                    if not cat:
                         continue
-
-                    cat_name = elem.Category.Name
-                    if not cat_name:
-                        continue
-
-                    # Skip non-model categories
-                    try:
-                        cat_type = elem.Category.CategoryType
-                        if cat_type != DB.CategoryType.Model:
-                            continue
-                    except Exception:
-                        pass
-
-                    if cat_name not in category_counts:
-                        category_counts[cat_name] = 0
-
-                    category_counts[cat_name] += 1
-                    total += 1
-
+                    cid = _id(cat.Id)
+                    counts_by_id[cid] += 1
+                    if cid not in id_to_name:
+                        id_to_name[cid] = cat.Name
                 except Exception:
                     continue
 
             # Sort by count descending
-            statistics = []
-            for name, count in sorted(category_counts.items(), key=lambda x: -x[1]):
-                statistics.append({
-                    "category": name,
-                    "count": count,
-                })
+            statistics = [
+                {"category": id_to_name[cid], "count": count}
+                for cid, count in counts_by_id.most_common()
+                if id_to_name[cid]
+            ]
+            total = sum(stat["count"] for stat in statistics)
 
             total_categories = len(statistics)
-            message = "Model contains {} element{} across {} categor{}".format(
+            message = "Model contains %d element%s across %d categor%s" % (
                 total,
-                "s" if total != 1 else "",
+                "s"[:total != 1],
                 total_categories,
-                "ies" if total_categories != 1 else "y",
+                ("y", "ies")[total_categories != 1],
             )
 
             return routes.make_response(
@@ -4,9 +4,15 @@ Annotation Module for Revit MCP
 Handles dimensions and wall tagging
 """
 
-from utils import get_element_name, get_element_id_value, make_element_id
+from utils import (
+    get_element_name, get_element_id_value, make_element_id, json_loads,
+    elements_valid, document_cache, store_document_cache, register_document_cache,
+    register_document_change_callback, ensure_document_listeners,
+)
 from pyrevit import routes, revit, DB
-import json
+from System.Collections.Generic import HashSet, List
+from collections import OrderedDict
+import math
 import traceback
 import logging
 
@@ -14,6 +20,223 @@ logger = logging.getLogger(__name__)
 
 MM_TO_FEET = 1.0 / 304.8
 
+# View types that can host dimensions
+DIMENSION_VIEW_TYPES = frozenset([
+    DB.ViewType.FloorPlan,
+    DB.ViewType.CeilingPlan,
+    DB.ViewType.Section,
+    DB.ViewType.Elevation,
+    DB.ViewType.Detail,
+    DB.ViewType.EngineeringPlan,
+    DB.ViewType.AreaPlan,
+])
+
+# Wall tag types per document (see utils.document_cache), evicted when a wall
+# tag type is added or changed
+register_document_cache(
+    "wall_tag_symbols",
+    DB.LogicalAndFilter(
+        DB.ElementClassFilter(DB.FamilySymbol),
+        DB.ElementCategoryFilter(DB.BuiltInCategory.OST_WallTags),
+    ),
+    lambda entry: elements_valid(entry[0]),
+)
+
+
+def _wall_tag_symbols(doc):
+    """Return (wall tag types in collector order, {type name: first type with that name})."""
+    def build(d):
+        symbols = []
+        by_name = {}
+        collector = (
+            DB.FilteredElementCollector(d)
+            .OfCategory(DB.BuiltInCategory.OST_WallTags)
+            .OfClass(DB.FamilySymbol)
+        )
+        for sym in collector:
+            symbols.append(sym)
+            try:
+                by_name.setdefault(get_element_name(sym), sym)
+            except Exception:
+                continue
+        return (symbols, by_name), set(get_element_id_value(sym) for sym in symbols)
+
+    return document_cache(doc, "wall_tag_symbols", build)
+
+
+def _find_wall_tag_symbol(doc, tag_type_name=None):
+    """
+    Return the wall tag type named tag_type_name, or the first wall tag type.
+    Returns None if the document has no wall tag types.
+    """
+    symbols, by_name = _wall_tag_symbols(doc)
+    if not symbols:
+        return None
+    return by_name.get(tag_type_name, symbols[0])
+
+
+# (doc hash, view id, element id) -> stable representation of the element's
+# first geometry reference, least recently used first. Entries are dropped by
+# _forget_geometry_references when the element is modified or deleted.
+_REF_CACHE = OrderedDict()
+_REF_CACHE_SIZE = 4096
+# doc hash -> number of _REF_CACHE entries for it, so the change listener can
+# skip documents with nothing cached without scanning the cache
+_REF_CACHE_DOCS = {}
+
+
+def _remember_reference(key, stable):
+    if key not in _REF_CACHE:
+        _REF_CACHE_DOCS[key[0]] = _REF_CACHE_DOCS.get(key[0], 0) + 1
+    _REF_CACHE[key] = stable
+    if len(_REF_CACHE) > _REF_CACHE_SIZE:
+        _forget_reference(next(iter(_REF_CACHE)))
+
+
+def _forget_reference(key):
+    if _REF_CACHE.pop(key, None) is not None:
+        remaining = _REF_CACHE_DOCS.get(key[0], 1) - 1
+        if remaining > 0:
+            _REF_CACHE_DOCS[key[0]] = remaining
+        else:
+            _REF_CACHE_DOCS.pop(key[0], None)
+
+
+def _forget_geometry_references(doc_key, touched):
+    """Document change callback: drop references of modified or deleted elements."""
+    for key in [
+        k for k in _REF_CACHE
+        if k[0] == doc_key and (touched is None or k[2] in touched)
+    ]:
+        _forget_reference(key)
+
+
+register_document_change_callback(
+    _forget_geometry_references, lambda doc_key: doc_key in _REF_CACHE_DOCS
+)
+
+
+# Geometry object types that expose a Reference property
+_REFERENCEABLE_GEOMETRY = (DB.Curve, DB.Point)
+
+
+def _first_geometry_reference(elem, options):
+    """Return the first geometry object reference of elem, looking into instances."""
+    geom = elem.get_Geometry(options)
+    if not geom:
+        return None
+    for geom_obj in geom:
+        if isinstance(geom_obj, _REFERENCEABLE_GEOMETRY):
+            if geom_obj.Reference:
+                return geom_obj.Reference
+        elif isinstance(geom_obj, DB.GeometryInstance):
+            inst_geom = geom_obj.GetInstanceGeometry()
+            if inst_geom:
+                for ig in inst_geom:
+                    if isinstance(ig, _REFERENCEABLE_GEOMETRY) and ig.Reference:
+                        return ig.Reference
+    return None
+
+
+def _cached_geometry_reference(doc, view, elem, options):
+    """
+    Return elem's first geometry reference in view, reusing earlier lookups.
+    References are cached as stable representation strings until the element
+    changes (see _forget_geometry_references).
+    """
+    ensure_document_listeners(doc)
+    key = (doc.GetHashCode(), get_element_id_value(view), get_element_id_value(elem))
+    stable = _REF_CACHE.get(key)
+    if stable is not None:
+        try:
+            ref = DB.Reference.ParseFromStableRepresentation(doc, stable)
+            if ref:
+                # Move to the most recently used end
+                del _REF_CACHE[key]
+                _REF_CACHE[key] = stable
+                return ref
+        except Exception:
+            pass
+        _forget_reference(key)
+
+    ref = _first_geometry_reference(elem, options)
+    if ref:
+        try:
+            _remember_reference(key, ref.ConvertToStableRepresentation(doc))
+        except Exception:
+            pass
+    return ref
+
+
+# Per-view tagged-wall sets (see utils.document_cache), keyed by view id value.
+# Evicted when a wall tag is added or changed, or one of the tags it was built
+# from is deleted; tag_walls writes its own new tags back after commit.
+register_document_cache(
+    "tagged_walls", DB.ElementCategoryFilter(DB.BuiltInCategory.OST_WallTags)
+)
+
+
+def _tagged_walls_in_view(doc, view):
+    """
+    Return (HashSet of wall ids tagged in view, set of the tag id values),
+    cached until a wall tag changes.
+    """
+    def build(d):
+        tagged_wall_ids = HashSet[DB.ElementId]()
+        tag_id_values = set()
+        existing_tags = (
+            DB.FilteredElementCollector(d, view.Id)
+            .OfCategory(DB.BuiltInCategory.OST_WallTags)
+            .WhereElementIsNotElementType()
+        )
+        for tag in existing_tags:
+            try:
+                if isinstance(tag, DB.IndependentTag):
+                    # Multi-reference tags (Revit 2022+) can tag several walls
+                    for wall_id in tag.GetTaggedLocalElementIds():
+                        tagged_wall_ids.Add(wall_id)
+                    tag_id_values.add(get_element_id_value(tag))
+            except Exception:
+                continue
+        return (tagged_wall_ids, tag_id_values), tag_id_values
+
+    return document_cache(doc, "tagged_walls", build, get_element_id_value(view))
+
+
+def _dimension_line(element_points, offset_dist=3.0):
+    """
+    Build the dimension line through the first and last element points,
+    offset perpendicular to them by offset_dist feet in plan.
+    """
+    if len(element_points) < 2:
+        # Fallback: create a horizontal line
+        return DB.Line.CreateBound(DB.XYZ(0, 10, 0), DB.XYZ(100, 10, 0))
+
+    p1 = element_points[0]
+    p2 = element_points[-1]
+
+    # Read each coordinate across the .NET boundary once
+    x1, y1, z1 = p1.X, p1.Y, p1.Z
+    x2, y2, z2 = p2.X, p2.Y, p2.Z
+
+    # Direction perpendicular to element line
+    dx = x2 - x1
+    dy = y2 - y1
+    length_sq = dx * dx + dy * dy
+
+    # Points closer than 0.001 ft in plan: no usable direction
+    if length_sq <= 1e-6:
+        return DB.Line.CreateBound(p1, p2)
+
+    # Offset perpendicular to the line
+    scale = offset_dist / math.sqrt(length_sq)
+    ox = -dy * scale
+    oy = dx * scale
+    return DB.Line.CreateBound(
+        DB.XYZ(x1 + ox, y1 + oy, z1),
+        DB.XYZ(x2 + ox, y2 + oy, z2),
+    )
+
 
 def register_annotation_routes(api):
     """Register all annotation routes with the API"""
@@ -32,7 +255,7 @@ def register_annotation_routes(api):
                     data={"error": "No data provided"}, status=400
                 )
 
-            data = json.loads(request.data) if isinstance(request.data, str) else request.data
+            data = json_loads(request.data) if isinstance(request.data, str) else request.data
 
             element_ids = data.get("element_ids", [])
             dimension_type = data.get("dimension_type", "linear")
@@ -50,17 +273,7 @@ def register_annotation_routes(api):
                 )
 
             # Check view type supports dimensions
-            view_type = active_view.ViewType
-            supported_types = [
-                DB.ViewType.FloorPlan,
-                DB.ViewType.CeilingPlan,
-                DB.ViewType.Section,
-                DB.ViewType.Elevation,
-                DB.ViewType.Detail,
-                DB.ViewType.EngineeringPlan,
-                DB.ViewType.AreaPlan,
-            ]
-            if view_type not in supported_types:
+            if active_view.ViewType not in DIMENSION_VIEW_TYPES:
                 return routes.make_response(
                     data={"error": "Current view does not support dimensions — switch to a plan, section, or elevation view"},
                     status=400,
@@ -70,9 +283,28 @@ def register_annotation_routes(api):
             ref_array = DB.ReferenceArray()
             element_points = []
 
-            for eid in element_ids:
-                elem_id = make_element_id(eid)
-                elem = doc.GetElement(elem_id)
+            # Shared geometry options for the reference fallback
+            geom_options = DB.Options()
+            geom_options.ComputeReferences = True
+            geom_options.View = active_view
+
+            # Fetch all requested elements in one collector pass; per-id
+            # lookups cover a rejected batch query and ids the collector
+            # skips (element types, which the instance filter drops)
+            requested_ids = [make_element_id(eid) for eid in element_ids]
+            try:
+                elements_by_id = dict(
+                    (get_element_id_value(el), el)
+                    for el in DB.FilteredElementCollector(doc, List[DB.ElementId](requested_ids))
+                    .WhereElementIsNotElementType()
+                )
+            except Exception:
+                elements_by_id = dict(
+                    (get_element_id_value(elem_id), doc.GetElement(elem_id)) for elem_id in requested_ids
+                )
+
+            for eid, elem_id in zip(element_ids, requested_ids):
+                elem = elements_by_id.get(get_element_id_value(elem_id)) or doc.GetElement(elem_id)
                 if not elem:
                     return routes.make_response(
                         data={"error": "Element {} not found or not visible in the current view".format(eid)},
@@ -81,42 +313,29 @@ def register_annotation_routes(api):
 
                 # Try to get a reference from the element
                 try:
-                    # For walls, get the location line reference
-                    if hasattr(elem, "Location") and elem.Location:
-                        loc = elem.Location
-                        if hasattr(loc, "Curve"):
-                            curve = loc.Curve
+                    # Curve-based elements: take a reference and the curve midpoint
+                    loc = elem.Location
+                    if isinstance(loc, DB.LocationCurve):
+                        curve = loc.Curve
+                        if isinstance(elem, DB.Wall):
+                            # Walls expose their side faces directly
+                            side_faces = DB.HostObjectUtils.GetSideFaces(elem, DB.ShellLayerType.Exterior)
+                            ref = side_faces[0] if side_faces.Count > 0 else None
+                        else:
                             ref = elem.GetReferenceByName("Center")
-                            if not ref:
-                                # Try getting reference from geometry
-                                options = DB.Options()
-                                options.ComputeReferences = True
-                                options.View = active_view
-                                geom = elem.get_Geometry(options)
-                                if geom:
-                                    for geom_obj in geom:
-                                        if hasattr(geom_obj, "Reference") and geom_obj.Reference:
-                                            ref = geom_obj.Reference
-                                            break
-                                        if hasattr(geom_obj, "GetInstanceGeometry"):
-                                            inst_geom = geom_obj.GetInstanceGeometry()
-                                            if inst_geom:
-                                                for ig in inst_geom:
-                                                    if hasattr(ig, "Reference") and ig.Reference:
-                                                        ref = ig.Reference
-                                                        break
-                            if ref:
-                                ref_array.Append(ref)
-                                # Track midpoint for dimension line placement
-                                mid = curve.Evaluate(0.5, True)
-                                element_points.append(mid)
-                        elif hasattr(loc, "Point"):
-                            point = loc.Point
-                            element_points.append(point)
+                        if not ref:
+                            # Try getting reference from geometry
+                            ref = _cached_geometry_reference(doc, active_view, elem, geom_options)
+                        if ref:
+                            ref_array.Append(ref)
+                            # Track midpoint for dimension line placement
+                            mid = curve.Evaluate(0.5, True)
+                            element_points.append(mid)
+                    elif isinstance(loc, DB.LocationPoint):
+                        point = loc.Point
+                        element_points.append(point)
                 except Exception as ref_err:
-                    logger.warning("Could not get reference for element {}: {}".format(
-                        eid, str(ref_err)
-                    ))
+                    logger.warning("Could not get reference for element %s: %s", eid, ref_err)
 
             if ref_array.Size < 2:
                 return routes.make_response(
@@ -130,39 +349,7 @@ def register_annotation_routes(api):
             try:
                 created = []
 
-                # Calculate dimension line position (offset from midpoint)
-                if len(element_points) >= 2:
-                    p1 = element_points[0]
-                    p2 = element_points[-1]
-                    mid = DB.XYZ(
-                        (p1.X + p2.X) / 2.0,
-                        (p1.Y + p2.Y) / 2.0,
-                        (p1.Z + p2.Z) / 2.0,
-                    )
-
-                    # Direction perpendicular to element line
-                    dx = p2.X - p1.X
-                    dy = p2.Y - p1.Y
-                    length = (dx * dx + dy * dy) ** 0.5
-
-                    if length > 0.001:
-                        # Offset perpendicular to the line
-                        offset_dist = 3.0  # 3 feet offset
-                        nx = -dy / length
-                        ny = dx / length
-                        offset_pt = DB.XYZ(mid.X + nx * offset_dist, mid.Y + ny * offset_dist, mid.Z)
-                        dim_line = DB.Line.CreateBound(
-                            DB.XYZ(p1.X + nx * offset_dist, p1.Y + ny * offset_dist, p1.Z),
-                            DB.XYZ(p2.X + nx * offset_dist, p2.Y + ny * offset_dist, p2.Z),
-                        )
-                    else:
-                        dim_line = DB.Line.CreateBound(p1, p2)
-                else:
-                    # Fallback: create a horizontal line
-                    dim_line = DB.Line.CreateBound(
-                        DB.XYZ(0, 10, 0),
-                        DB.XYZ(100, 10, 0),
-                    )
+                dim_line = _dimension_line(element_points)
 
                 dim = doc.Create.NewDimension(active_view, dim_line, ref_array)
 
@@ -182,9 +369,8 @@ def register_annotation_routes(api):
 
                 t.Commit()
 
-                message = "Created {} dimension annotation{} in the current view".format(
-                    len(created),
-                    "s" if len(created) != 1 else ""
+                message = "Created %d dimension annotation%s in the current view" % (
+                    len(created), "s"[:len(created) != 1]
                 )
 
                 return routes.make_response(
@@ -202,11 +388,10 @@ def register_annotation_routes(api):
                 raise tx_error
 
         except Exception as e:
-            logger.error("Failed to create dimensions: {}".format(str(e)))
-            error_trace = traceback.format_exc()
-            return routes.make_response(
-                data={"error": str(e), "traceback": error_trace}, status=500
-            )
+            logger.error("Failed to create dimensions: %s", e)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(traceback.format_exc())
+            return routes.make_response(data={"error": str(e)}, status=500)
 
     @api.route("/tag_walls/", methods=["POST"])
     def tag_walls_handler(doc, request):
@@ -219,7 +404,7 @@ def register_annotation_routes(api):
 
             data = {}
             if request and request.data:
-                data = json.loads(request.data) if isinstance(request.data, str) else request.data
+                data = json_loads(request.data) if isinstance(request.data, str) else request.data
 
             use_leader = data.get("use_leader", False)
             tag_type_name = data.get("tag_type_name")
@@ -230,118 +415,99 @@ def register_annotation_routes(api):
                     data={"error": "No active view"}, status=400
                 )
 
-            # Find wall tag types
-            tag_symbols = (
-                DB.FilteredElementCollector(doc)
-                .OfCategory(DB.BuiltInCategory.OST_WallTags)
-                .OfClass(DB.FamilySymbol)
-                .ToElements()
-            )
-
-            if not tag_symbols or len(tag_symbols) == 0:
+            # Find specific tag type or use first
+            target_tag = _find_wall_tag_symbol(doc, tag_type_name)
+            if not target_tag:
                 return routes.make_response(
                     data={"error": "No wall tag types found — load wall tag families into the project"},
                     status=400,
                 )
 
-            # Find specific tag type or use first
-            target_tag = None
-            if tag_type_name:
-                for sym in tag_symbols:
-                    try:
-                        if get_element_name(sym) == tag_type_name:
-                            target_tag = sym
-                            break
-                    except Exception:
-                        continue
+            # Get walls visible in the current view
+            def _view_walls():
+                return (
+                    DB.FilteredElementCollector(doc, active_view.Id)
+                    .OfCategory(DB.BuiltInCategory.OST_Walls)
+                    .WhereElementIsNotElementType()
+                )
 
-            if not target_tag:
-                target_tag = tag_symbols[0]
+            walls_total = _view_walls().GetElementCount()
 
-            # Get walls visible in the current view
-            walls = (
-                DB.FilteredElementCollector(doc, active_view.Id)
-                .OfCategory(DB.BuiltInCategory.OST_Walls)
-                .WhereElementIsNotElementType()
-                .ToElements()
-            )
-
-            if not walls or len(walls) == 0:
+            if walls_total == 0:
                 return routes.make_response(
                     data={"error": "Current view has no walls to tag"},
                     status=400,
                 )
 
             # Find already-tagged walls
-            existing_tags = (
-                DB.FilteredElementCollector(doc, active_view.Id)
-                .OfCategory(DB.BuiltInCategory.OST_WallTags)
-                .WhereElementIsNotElementType()
-                .ToElements()
-            )
-
-            tagged_wall_ids = set()
-            for tag in existing_tags:
+            tagged_wall_ids, tag_id_values = _tagged_walls_in_view(doc, active_view)
+
+            # Let the collector drop already-tagged walls natively
+            untagged_walls = _view_walls()
+            if tagged_wall_ids.Count > 0:
+                untagged_walls = untagged_walls.Excluding(tagged_wall_ids)
+            walls_already_tagged = walls_total - untagged_walls.GetElementCount()
+
+            # Resolve tag placements before opening the transaction so the
+            # transaction only covers IndependentTag.Create calls
+            placements = []
+            for wall in untagged_walls:
+                # Get wall midpoint for tag placement
                 try:
-                    if hasattr(tag, "TaggedLocalElementId"):
-                        tagged_wall_ids.add(get_element_id_value(tag.TaggedLocalElementId))
-                except Exception:
-                    continue
+                    loc = wall.Location
+                    if not isinstance(loc, DB.LocationCurve):
+                        continue
+                    mid = loc.Curve.Evaluate(0.5, True)
+                    placements.append((wall, DB.Reference(wall), mid))
+                except Exception as loc_err:
+                    logger.warning("Could not locate wall %s: %s", get_element_id_value(wall), loc_err)
 
             t = DB.Transaction(doc, "Tag Walls via MCP")
             t.Start()
 
             try:
                 tags_placed = 0
-                walls_already_tagged = 0
+                newly_tagged = []
 
                 # Activate tag symbol
                 if not target_tag.IsActive:
                     target_tag.Activate()
                     doc.Regenerate()
 
-                for wall in walls:
-                    wall_id_val = get_element_id_value(wall)
-                    if wall_id_val in tagged_wall_ids:
-                        walls_already_tagged += 1
-                        continue
-
-                    # Get wall midpoint for tag placement
+                # Revit has no call that places several independent tags at
+                # once (the IList<Reference> overload builds one multi-reference
+                # tag), so bind the per-tag arguments once and loop
+                create_tag = DB.IndependentTag.Create
+                view_id = active_view.Id
+                tag_mode = DB.TagMode.TM_ADDBY_CATEGORY
+                orientation = DB.TagOrientation.Horizontal
+                for wall, ref, mid in placements:
                     try:
-                        loc = wall.Location
-                        if not loc or not hasattr(loc, "Curve"):
-                            continue
-
-                        curve = loc.Curve
-                        mid = curve.Evaluate(0.5, True)
-                        tag_point = DB.UV(mid.X, mid.Y)
-
                         # Create tag using Revit 2026 API
-                        ref = DB.Reference(wall)
-                        tag = DB.IndependentTag.Create(
-                            doc,
-                            active_view.Id,
-                            ref,
-                            use_leader,
-                            DB.TagMode.TM_ADDBY_CATEGORY,
-                            DB.TagOrientation.Horizontal,
-                            mid,
-                        )
+                        tag = create_tag(doc, view_id, ref, use_leader, tag_mode, orientation, mid)
 
                         if tag:
                             tags_placed += 1
+                            newly_tagged.append((wall.Id, tag.Id))
                     except Exception as tag_err:
-                        logger.warning("Could not tag wall {}: {}".format(
-                            wall_id_val, str(tag_err)
-                        ))
+                        logger.warning("Could not tag wall %s: %s", get_element_id_value(wall), tag_err)
                         continue
 
                 t.Commit()
 
-                walls_total = len(walls)
-                message = "Tagged {} wall{} ({} already tagged, {} total in view)".format(
+                # Write our own tags through to the cache; the commit's
+                # DocumentChanged event has already cleared the old entry
+                for wall_id, tag_id in newly_tagged:
+                    tagged_wall_ids.Add(wall_id)
+                    tag_id_values.add(get_element_id_value(tag_id))
+                store_document_cache(
+                    doc, "tagged_walls", (tagged_wall_ids, tag_id_values), tag_id_values,
+                    get_element_id_value(active_view),
+                )
+
+                message = "Tagged %d wall%s (%d already tagged, %d total in view)" % (
                     tags_placed,
-                    "s" if tags_placed != 1 else "",
+                    "s"[:tags_placed != 1],
                     walls_already_tagged,
                     walls_total,
                 )
@@ -362,10 +528,9 @@ def register_annotation_routes(api):
                 raise tx_error
 
         except Exception as e:
-            logger.error("Failed to tag walls: {}".format(str(e)))
-            error_trace = traceback.format_exc()
-            return routes.make_response(
-                data={"error": str(e), "traceback": error_trace}, status=500
-            )
+            logger.error("Failed to tag walls: %s", e)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(traceback.format_exc())
+            return routes.make_response(data={"error": str(e)}, status=500)
 
     logger.info("Annotation routes registered successfully")
@@ -5,15 +5,202 @@ Handles creation of line-based elements (walls, beams), surface-based
 elements (floors, roofs, ceilings), and levels.
 """
 
-from utils import get_element_name, get_element_id_value
+from utils import (
+    get_element_name, get_element_id_value, json_loads, elements_valid,
+    document_cache, ensure_document_listeners, register_document_cache,
+    register_document_change_callback,
+)
 from pyrevit import routes, revit, DB
 from System.Collections.Generic import List
-import json
 import traceback
 import logging
 
 logger = logging.getLogger(__name__)
 
+MM_TO_FEET = 1.0 / 304.8
+
+# Enum members used on every request, resolved once at import
+_BIC_LEVELS = DB.BuiltInCategory.OST_Levels
+_BIC_FRAMING = DB.BuiltInCategory.OST_StructuralFraming
+_BIP_FLOOR_OFFSET = DB.BuiltInParameter.FLOOR_HEIGHTABOVELEVEL_PARAM
+_ST_BEAM = DB.Structure.StructuralType.Beam
+
+# Closed generic type for Floor.Create, bound once instead of per floor
+_CurveLoopList = List[DB.CurveLoop]
+
+# doc hash -> {element id value: element name}; entries are dropped when the
+# element is modified or deleted, or when its document closes
+_NAME_CACHE = {}
+
+
+def _element_map_valid(by_name):
+    """Cache-hit check for {name: element} maps: every element still alive."""
+    return elements_valid(by_name.values())
+
+
+# Per-document maps (see utils.document_cache), evicted when an element of
+# that kind is added or changed
+register_document_cache("levels", DB.ElementClassFilter(DB.Level), _element_map_valid)
+register_document_cache("level_elevations", DB.ElementClassFilter(DB.Level))
+register_document_cache("wall_types", DB.ElementClassFilter(DB.WallType), _element_map_valid)
+register_document_cache(
+    "beam_types",
+    DB.LogicalAndFilter(
+        DB.ElementClassFilter(DB.FamilySymbol),
+        DB.ElementCategoryFilter(_BIC_FRAMING),
+    ),
+    _element_map_valid,
+)
+register_document_cache("floor_types", DB.ElementClassFilter(DB.FloorType), _element_map_valid)
+register_document_cache("roof_types", DB.ElementClassFilter(DB.RoofType), _element_map_valid)
+
+
+def _forget_names(doc_key, touched):
+    """Document change callback: drop cached names of touched elements."""
+    if touched is None:
+        _NAME_CACHE.pop(doc_key, None)
+        return
+    names = _NAME_CACHE.get(doc_key)
+    if names:
+        for id_value in touched:
+            names.pop(id_value, None)
+
+
+register_document_change_callback(
+    _forget_names, lambda doc_key: bool(_NAME_CACHE.get(doc_key))
+)
+
+
+def _cached_name_map(doc, kind, collect):
+    """
+    Return {element name: element} for the given map kind via document_cache.
+    collect(doc) returns the collector to index; it is iterated directly
+    rather than materialised with ToElements(). The names read here also
+    seed _NAME_CACHE.
+    """
+    def build(d):
+        names = _NAME_CACHE.setdefault(d.GetHashCode(), {})
+        by_name = {}
+        id_values = set()
+        for el in collect(d):
+            try:
+                name = get_element_name(el)
+                id_value = get_element_id_value(el)
+            except Exception:
+                continue
+            by_name[name] = el
+            id_values.add(id_value)
+            names[id_value] = name
+        return by_name, id_values
+
+    return document_cache(doc, kind, build)
+
+
+def _element_name(doc, element):
+    """get_element_name() memoised per (doc hash, element id value)."""
+    names = _NAME_CACHE.get(doc.GetHashCode())
+    if names is None:
+        ensure_document_listeners(doc)
+        names = _NAME_CACHE.setdefault(doc.GetHashCode(), {})
+    id_value = get_element_id_value(element)
+    name = names.get(id_value)
+    if name is None:
+        name = names[id_value] = get_element_name(element)
+    return name
+
+
+def _get_level_map(doc):
+    return _cached_name_map(doc, "levels", lambda d: (
+        DB.FilteredElementCollector(d)
+        .OfCategory(_BIC_LEVELS)
+        .WhereElementIsNotElementType()
+    ))
+
+
+def _get_level_elevation_map(doc):
+    """Return {level id value: elevation in feet}, read once per document change."""
+    def build(d):
+        elevations = {}
+        for lv in _get_level_map(d).values():
+            elevations[get_element_id_value(lv)] = lv.Elevation
+        return elevations, set(elevations)
+
+    return document_cache(doc, "level_elevations", build)
+
+
+def _get_wall_type_map(doc):
+    return _cached_name_map(doc, "wall_types", lambda d: (
+        DB.FilteredElementCollector(d)
+        .WhereElementIsElementType()
+        .OfClass(DB.WallType)
+    ))
+
+
+def _get_beam_type_map(doc):
+    return _cached_name_map(doc, "beam_types", lambda d: (
+        DB.FilteredElementCollector(d)
+        .WhereElementIsElementType()
+        .OfClass(DB.FamilySymbol)
+        .OfCategory(_BIC_FRAMING)
+    ))
+
+
+def _get_floor_type_map(doc):
+    return _cached_name_map(doc, "floor_types", lambda d: (
+        DB.FilteredElementCollector(d)
+        .WhereElementIsElementType()
+        .OfClass(DB.FloorType)
+    ))
+
+
+def _get_roof_type_map(doc):
+    return _cached_name_map(doc, "roof_types", lambda d: (
+        DB.FilteredElementCollector(d)
+        .WhereElementIsElementType()
+        .OfClass(DB.RoofType)
+    ))
+
+
+def _iter_segments(boundary):
+    """
+    Yield (x0, y0, z0, x1, y1, z1) float tuples in mm for a surface boundary,
+    reading each coordinate once. The format is detected from the first entry:
+    point format [{"x", "y", "z"}, ...] is closed implicitly, segment format
+    is [{"p0": {...}, "p1": {...}}, ...].
+    """
+    if "x" in boundary[0] or "y" in boundary[0]:
+        first = prev = None
+        for pt in boundary:
+            cur = (float(pt.get("x", 0)), float(pt.get("y", 0)), float(pt.get("z", 0)))
+            if prev is None:
+                first = cur
+            else:
+                yield prev + cur
+            prev = cur
+        yield prev + first
+    else:
+        for seg in boundary:
+            p0 = seg.get("p0", {})
+            p1 = seg.get("p1", {})
+            yield (
+                float(p0.get("x", 0)), float(p0.get("y", 0)), float(p0.get("z", 0)),
+                float(p1.get("x", 0)), float(p1.get("y", 0)), float(p1.get("z", 0)),
+            )
+
+
+def _build_curve_container(segments, container):
+    """
+    Append one line per (x0, y0, z0, x1, y1, z1) segment (mm) to a
+    DB.CurveLoop or DB.CurveArray and return it.
+    """
+    xyz = DB.XYZ
+    create_bound = DB.Line.CreateBound
+    append = container.Append
+    k = MM_TO_FEET
+    for x0, y0, z0, x1, y1, z1 in segments:
+        append(create_bound(xyz(x0 * k, y0 * k, z0 * k), xyz(x1 * k, y1 * k, z1 * k)))
+    return container
+
 
 def register_building_routes(api):
     """Register all building creation routes with the API"""
@@ -31,7 +218,7 @@ def register_building_routes(api):
                     status=503,
                 )
 
-            data = json.loads(request.data) if isinstance(request.data, str) else request.data
+            data = json_loads(request.data) if isinstance(request.data, str) else request.data
             elements = data.get("elements", [])
 
             if not elements:
@@ -40,19 +227,8 @@ def register_building_routes(api):
                     status=400,
                 )
 
-            # Collect all levels and wall/beam types once for performance
-            all_levels = (
-                DB.FilteredElementCollector(doc)
-                .OfCategory(DB.BuiltInCategory.OST_Levels)
-                .WhereElementIsNotElementType()
-                .ToElements()
-            )
-            level_map = {}
-            for lv in all_levels:
-                try:
-                    level_map[get_element_name(lv)] = lv
-                except Exception:
-                    continue
+            # Levels and wall/beam types, cached across requests
+            level_map = _get_level_map(doc)
 
             if not level_map:
                 return routes.make_response(
@@ -60,185 +236,201 @@ def register_building_routes(api):
                     status=404,
                 )
 
-            wall_types = (
-                DB.FilteredElementCollector(doc)
-                .OfClass(DB.WallType)
-                .ToElements()
+            # Lowest level and first available types, used when a name is omitted
+            elevations = _get_level_elevation_map(doc)
+            default_level = min(
+                level_map.values(), key=lambda x: elevations[get_element_id_value(x)]
             )
-            wall_type_map = {}
-            for wt in wall_types:
-                try:
-                    wall_type_map[get_element_name(wt)] = wt
-                except Exception:
-                    continue
 
-            beam_types = (
-                DB.FilteredElementCollector(doc)
-                .OfCategory(DB.BuiltInCategory.OST_StructuralFraming)
-                .OfClass(DB.FamilySymbol)
-                .ToElements()
-            )
-            beam_type_map = {}
-            for bt in beam_types:
-                try:
-                    beam_type_map[get_element_name(bt)] = bt
-                except Exception:
-                    continue
+            wall_type_map = _get_wall_type_map(doc)
+            beam_type_map = _get_beam_type_map(doc)
+            default_wall_type = next(iter(wall_type_map.values()), None)
+            default_beam_type = next(iter(beam_type_map.values()), None)
+
+            # Name lists quoted in lookup errors, sorted once per request
+            available_levels = ", ".join(sorted(level_map.keys()))
+            available_wall_types = ", ".join(sorted(wall_type_map.keys())[:10])
+            available_beam_types = ", ".join(sorted(beam_type_map.keys())[:10])
 
             created = []
             errors = []
 
-            t = DB.Transaction(doc, "Create Line-Based Elements")
-            t.Start()
-
-            try:
-                for idx, elem in enumerate(elements):
-                    try:
-                        element_type = elem.get("element_type")
-                        if not element_type:
-                            errors.append("Element {}: element_type is required".format(idx))
-                            continue
+            # Pass 1: validate, resolve levels/types and build geometry
+            # outside the transaction
+            ready = []
+            for idx, elem in enumerate(elements):
+                try:
+                    element_type = elem.get("element_type")
+                    if not element_type:
+                        errors.append("Element {}: element_type is required".format(idx))
+                        continue
 
-                        start = elem.get("start_point")
-                        end = elem.get("end_point")
-                        if not start or not end:
-                            errors.append("Element {}: start_point and end_point are required".format(idx))
-                            continue
+                    start = elem.get("start_point")
+                    end = elem.get("end_point")
+                    if not start or not end:
+                        errors.append("Element {}: start_point and end_point are required".format(idx))
+                        continue
 
-                        # Convert mm to feet
-                        sp = DB.XYZ(
-                            float(start["x"]) / 304.8,
-                            float(start["y"]) / 304.8,
-                            float(start.get("z", 0)) / 304.8,
-                        )
-                        ep = DB.XYZ(
-                            float(end["x"]) / 304.8,
-                            float(end["y"]) / 304.8,
-                            float(end.get("z", 0)) / 304.8,
+                    # Convert mm to feet
+                    sp = DB.XYZ(
+                        float(start["x"]) * MM_TO_FEET,
+                        float(start["y"]) * MM_TO_FEET,
+                        float(start.get("z", 0)) * MM_TO_FEET,
+                    )
+                    ep = DB.XYZ(
+                        float(end["x"]) * MM_TO_FEET,
+                        float(end["y"]) * MM_TO_FEET,
+                        float(end.get("z", 0)) * MM_TO_FEET,
+                    )
+
+                    # Validate non-zero length
+                    if sp.DistanceTo(ep) < 0.001:
+                        errors.append(
+                            "Element {}: Start and end points must be different (zero-length element)".format(idx)
                         )
+                        continue
+
+                    line = DB.Line.CreateBound(sp, ep)
 
-                        # Validate non-zero length
-                        if sp.DistanceTo(ep) < 0.001:
+                    # Find level
+                    level_name = elem.get("level_name")
+                    level = None
+                    if level_name:
+                        level = level_map.get(level_name)
+                        if not level:
                             errors.append(
-                                "Element {}: Start and end points must be different (zero-length element)".format(idx)
+                                "Element {}: Level '{}' not found. Available levels: {}".format(
+                                    idx, level_name, available_levels
+                                )
                             )
                             continue
-
-                        line = DB.Line.CreateBound(sp, ep)
-
-                        # Find level
-                        level_name = elem.get("level_name")
-                        level = None
-                        if level_name:
-                            level = level_map.get(level_name)
-                            if not level:
-                                available = ", ".join(sorted(level_map.keys()))
+                    else:
+                        level = default_level
+
+                    if element_type == "wall":
+                        type_name = elem.get("type_name")
+                        wall_type = None
+                        if type_name:
+                            wall_type = wall_type_map.get(type_name)
+                            if not wall_type:
                                 errors.append(
-                                    "Element {}: Level '{}' not found. Available levels: {}".format(
-                                        idx, level_name, available
+                                    "Element {}: Wall type '{}' not found. Available types: {}".format(
+                                        idx, type_name, available_wall_types
                                     )
                                 )
                                 continue
                         else:
-                            # Use first level (lowest elevation)
-                            sorted_levels = sorted(level_map.values(), key=lambda x: x.Elevation)
-                            level = sorted_levels[0]
+                            wall_type = default_wall_type
+                            if not wall_type:
+                                errors.append(
+                                    "Element {}: No wall types available — load wall families into the project".format(idx)
+                                )
+                                continue
 
-                        if element_type == "wall":
-                            type_name = elem.get("type_name")
-                            wall_type = None
-                            if type_name:
-                                wall_type = wall_type_map.get(type_name)
-                                if not wall_type:
-                                    available = ", ".join(sorted(wall_type_map.keys())[:10])
-                                    errors.append(
-                                        "Element {}: Wall type '{}' not found. Available types: {}".format(
-                                            idx, type_name, available
-                                        )
-                                    )
-                                    continue
-                            else:
-                                if wall_type_map:
-                                    wall_type = list(wall_type_map.values())[0]
-                                else:
-                                    errors.append(
-                                        "Element {}: No wall types available — load wall families into the project".format(idx)
+                        wall_args = (
+                            float(elem.get("height", 3000)) * MM_TO_FEET,
+                            float(elem.get("offset", 0)) * MM_TO_FEET,
+                            bool(elem.get("structural", False)),
+                        )
+                        ready.append((idx, elem, element_type, line, level, wall_type, wall_args))
+
+                    elif element_type == "beam":
+                        type_name = elem.get("type_name")
+                        beam_type = None
+                        if type_name:
+                            beam_type = beam_type_map.get(type_name)
+                            if not beam_type:
+                                errors.append(
+                                    "Element {}: Beam type '{}' not found. Available types: {}".format(
+                                        idx, type_name, available_beam_types
                                     )
-                                    continue
+                                )
+                                continue
+                        else:
+                            beam_type = default_beam_type
+                            if not beam_type:
+                                errors.append(
+                                    "Element {}: No beam types available — load structural framing families".format(idx)
+                                )
+                                continue
+
+                        ready.append((idx, elem, element_type, line, level, beam_type, None))
 
-                            height_mm = float(elem.get("height", 3000))
-                            height_feet = height_mm / 304.8
-                            offset_mm = float(elem.get("offset", 0))
-                            offset_feet = offset_mm / 304.8
-                            is_structural = bool(elem.get("structural", False))
+                    else:
+                        errors.append(
+                            "Element {}: element_type '{}' not supported — use 'wall' or 'beam'".format(
+                                idx, element_type
+                            )
+                        )
+                        continue
+
+                except Exception as elem_err:
+                    errors.append("Element {}: {}".format(idx, str(elem_err)))
+                    continue
 
-                            wall = DB.Wall.Create(
+            # Pass 2: only the Revit create calls run inside the transaction
+            t = DB.Transaction(doc, "Create Line-Based Elements")
+            t.Start()
+
+            try:
+                # Activate every inactive beam type the batch uses, then
+                # regenerate once rather than once per beam
+                to_activate = {}
+                for op in ready:
+                    if op[2] == "beam" and not op[5].IsActive:
+                        to_activate[get_element_id_value(op[5])] = op[5]
+                # beam type id value -> activation error, reported against
+                # every beam that uses that type
+                activation_errors = {}
+                activated = []
+                for type_key, beam_type in to_activate.items():
+                    try:
+                        beam_type.Activate()
+                        activated.append(type_key)
+                    except Exception as act_err:
+                        activation_errors[type_key] = str(act_err)
+                if activated:
+                    try:
+                        doc.Regenerate()
+                    except Exception as regen_err:
+                        for type_key in activated:
+                            activation_errors[type_key] = str(regen_err)
+
+                for idx, elem, element_type, line, level, symbol, wall_args in ready:
+                    try:
+                        if element_type == "beam" and activation_errors:
+                            act_err = activation_errors.get(get_element_id_value(symbol))
+                            if act_err is not None:
+                                errors.append("Element {}: could not activate beam type: {}".format(idx, act_err))
+                                continue
+
+                        if element_type == "wall":
+                            height_feet, offset_feet, is_structural = wall_args
+                            new_elem = DB.Wall.Create(
                                 doc,
                                 line,
-                                wall_type.Id,
+                                symbol.Id,
                                 level.Id,
                                 height_feet,
                                 offset_feet,
                                 False,
                                 is_structural,
                             )
-
-                            created.append({
-                                "id": get_element_id_value(wall),
-                                "name": elem.get("name", ""),
-                                "type": get_element_name(wall_type),
-                                "level": get_element_name(level),
-                                "element_type": "wall",
-                            })
-
-                        elif element_type == "beam":
-                            type_name = elem.get("type_name")
-                            beam_type = None
-                            if type_name:
-                                beam_type = beam_type_map.get(type_name)
-                                if not beam_type:
-                                    available = ", ".join(sorted(beam_type_map.keys())[:10])
-                                    errors.append(
-                                        "Element {}: Beam type '{}' not found. Available types: {}".format(
-                                            idx, type_name, available
-                                        )
-                                    )
-                                    continue
-                            else:
-                                if beam_type_map:
-                                    beam_type = list(beam_type_map.values())[0]
-                                else:
-                                    errors.append(
-                                        "Element {}: No beam types available — load structural framing families".format(idx)
-                                    )
-                                    continue
-
-                            if not beam_type.IsActive:
-                                beam_type.Activate()
-                                doc.Regenerate()
-
-                            beam = doc.Create.NewFamilyInstance(
+                        else:
+                            new_elem = doc.Create.NewFamilyInstance(
                                 line,
-                                beam_type,
+                                symbol,
                                 level,
-                                DB.Structure.StructuralType.Beam,
+                                _ST_BEAM,
                             )
 
-                            created.append({
-                                "id": get_element_id_value(beam),
-                                "name": elem.get("name", ""),
-                                "type": get_element_name(beam_type),
-                                "level": get_element_name(level),
-                                "element_type": "beam",
-                            })
-
-                        else:
-                            errors.append(
-                                "Element {}: element_type '{}' not supported — use 'wall' or 'beam'".format(
-                                    idx, element_type
-                                )
-                            )
-                            continue
+                        created.append({
+                            "id": get_element_id_value(new_elem),
+                            "name": elem.get("name", ""),
+                            "type": _element_name(doc, symbol),
+                            "level": _element_name(doc, level),
+                            "element_type": element_type,
+                        })
 
                     except Exception as elem_err:
                         errors.append("Element {}: {}".format(idx, str(elem_err)))
@@ -285,7 +477,7 @@ def register_building_routes(api):
                     status=503,
                 )
 
-            data = json.loads(request.data) if isinstance(request.data, str) else request.data
+            data = json_loads(request.data) if isinstance(request.data, str) else request.data
             elements = data.get("elements", [])
 
             if not elements:
@@ -294,19 +486,8 @@ def register_building_routes(api):
                     status=400,
                 )
 
-            # Collect levels
-            all_levels = (
-                DB.FilteredElementCollector(doc)
-                .OfCategory(DB.BuiltInCategory.OST_Levels)
-                .WhereElementIsNotElementType()
-                .ToElements()
-            )
-            level_map = {}
-            for lv in all_levels:
-                try:
-                    level_map[get_element_name(lv)] = lv
-                except Exception:
-                    continue
+            # Levels and floor/roof types, cached across requests
+            level_map = _get_level_map(doc)
 
             if not level_map:
                 return routes.make_response(
@@ -314,214 +495,176 @@ def register_building_routes(api):
                     status=404,
                 )
 
-            # Collect floor types
-            floor_types = DB.FilteredElementCollector(doc).OfClass(DB.FloorType).ToElements()
-            floor_type_map = {}
-            for ft in floor_types:
-                try:
-                    floor_type_map[get_element_name(ft)] = ft
-                except Exception:
-                    continue
+            # Lowest level and first available types, used when a name is omitted
+            elevations = _get_level_elevation_map(doc)
+            default_level = min(
+                level_map.values(), key=lambda x: elevations[get_element_id_value(x)]
+            )
 
-            # Collect roof types
-            roof_types = DB.FilteredElementCollector(doc).OfClass(DB.RoofType).ToElements()
-            roof_type_map = {}
-            for rt in roof_types:
-                try:
-                    roof_type_map[get_element_name(rt)] = rt
-                except Exception:
-                    continue
+            floor_type_map = _get_floor_type_map(doc)
+            roof_type_map = _get_roof_type_map(doc)
+            default_floor_type = next(iter(floor_type_map.values()), None)
+            default_roof_type = next(iter(roof_type_map.values()), None)
+
+            # Name lists quoted in lookup errors, sorted once per request
+            available_levels = ", ".join(sorted(level_map.keys()))
+            available_floor_types = ", ".join(sorted(floor_type_map.keys())[:10])
+            available_roof_types = ", ".join(sorted(roof_type_map.keys())[:10])
 
             created = []
             errors = []
 
-            t = DB.Transaction(doc, "Create Surface-Based Elements")
-            t.Start()
+            # Pass 1: validate, resolve levels/types and build boundary curves
+            # outside the transaction
+            ready = []
+            for idx, elem in enumerate(elements):
+                try:
+                    element_type = elem.get("element_type")
+                    if not element_type:
+                        errors.append("Element {}: element_type is required".format(idx))
+                        continue
 
-            try:
-                for idx, elem in enumerate(elements):
-                    try:
-                        element_type = elem.get("element_type")
-                        if not element_type:
-                            errors.append("Element {}: element_type is required".format(idx))
-                            continue
+                    if element_type not in ("floor", "roof", "ceiling"):
+                        errors.append(
+                            "Element {}: element_type must be 'floor', 'roof', or 'ceiling'".format(idx)
+                        )
+                        continue
 
-                        if element_type not in ("floor", "roof", "ceiling"):
-                            errors.append(
-                                "Element {}: element_type must be 'floor', 'roof', or 'ceiling'".format(idx)
+                    boundary = elem.get("boundary", [])
+                    if len(boundary) < 3:
+                        errors.append(
+                            "Element {}: Boundary requires at least 3 points/segments, got {}".format(
+                                idx, len(boundary)
                             )
-                            continue
+                        )
+                        continue
 
-                        boundary = elem.get("boundary", [])
-                        if len(boundary) < 3:
-                            errors.append(
-                                "Element {}: Boundary requires at least 3 points/segments, got {}".format(
-                                    idx, len(boundary)
-                                )
+                    # BUG-007: point format and segment format are both accepted;
+                    # materialised once for the closure check and curve builder
+                    segments = list(_iter_segments(boundary))
+
+                    # Validate closed polygon
+                    fx, fy, fz = segments[0][:3]
+                    lx, ly, lz = segments[-1][3:]
+                    dx = fx - lx
+                    dy = fy - ly
+                    dz = fz - lz
+                    if dx * dx + dy * dy + dz * dz > 1.0:  # tolerance of 1mm (squared)
+                        errors.append(
+                            "Element {}: Boundary must form a closed polygon — last point ({}, {}, {}) does not match first point ({}, {}, {})".format(
+                                idx, lx, ly, lz, fx, fy, fz
                             )
-                            continue
+                        )
+                        continue
 
-                        # BUG-007: Auto-detect point format vs segment format
-                        # Point format: [{"x":0,"y":0,"z":0}, ...]
-                        # Segment format: [{"p0":{"x":0,...},"p1":{"x":0,...}}, ...]
-                        if "x" in boundary[0] or "y" in boundary[0]:
-                            # Point array format — convert to segment format
-                            points = boundary
-                            boundary = []
-                            for pi in range(len(points)):
-                                p0 = points[pi]
-                                p1 = points[(pi + 1) % len(points)]
-                                boundary.append({"p0": p0, "p1": p1})
-
-                        # Validate closed polygon
-                        first_p0 = boundary[0].get("p0", {})
-                        last_p1 = boundary[-1].get("p1", {})
-                        fp = (float(first_p0.get("x", 0)), float(first_p0.get("y", 0)), float(first_p0.get("z", 0)))
-                        lp = (float(last_p1.get("x", 0)), float(last_p1.get("y", 0)), float(last_p1.get("z", 0)))
-                        dist = ((fp[0] - lp[0]) ** 2 + (fp[1] - lp[1]) ** 2 + (fp[2] - lp[2]) ** 2) ** 0.5
-                        if dist > 1.0:  # tolerance of 1mm
+                    # Find level
+                    level_name = elem.get("level_name")
+                    level = None
+                    if level_name:
+                        level = level_map.get(level_name)
+                        if not level:
                             errors.append(
-                                "Element {}: Boundary must form a closed polygon — last point ({}, {}, {}) does not match first point ({}, {}, {})".format(
-                                    idx, lp[0], lp[1], lp[2], fp[0], fp[1], fp[2]
+                                "Element {}: Level '{}' not found. Available levels: {}".format(
+                                    idx, level_name, available_levels
                                 )
                             )
                             continue
-
-                        # Find level
-                        level_name = elem.get("level_name")
-                        level = None
-                        if level_name:
-                            level = level_map.get(level_name)
-                            if not level:
-                                available = ", ".join(sorted(level_map.keys()))
+                    else:
+                        level = default_level
+
+                    if element_type == "floor" or element_type == "ceiling":
+                        type_name = elem.get("type_name")
+                        floor_type = None
+                        if type_name:
+                            floor_type = floor_type_map.get(type_name)
+                            if not floor_type:
                                 errors.append(
-                                    "Element {}: Level '{}' not found. Available levels: {}".format(
-                                        idx, level_name, available
+                                    "Element {}: Floor type '{}' not found. Available: {}".format(
+                                        idx, type_name, available_floor_types
                                     )
                                 )
                                 continue
                         else:
-                            sorted_levels = sorted(level_map.values(), key=lambda x: x.Elevation)
-                            level = sorted_levels[0]
-
-                        if element_type == "floor" or element_type == "ceiling":
-                            type_name = elem.get("type_name")
-                            floor_type = None
-                            if type_name:
-                                floor_type = floor_type_map.get(type_name)
-                                if not floor_type:
-                                    available = ", ".join(sorted(floor_type_map.keys())[:10])
-                                    errors.append(
-                                        "Element {}: Floor type '{}' not found. Available: {}".format(
-                                            idx, type_name, available
-                                        )
-                                    )
-                                    continue
-                            else:
-                                if floor_type_map:
-                                    floor_type = list(floor_type_map.values())[0]
-                                else:
-                                    errors.append(
-                                        "Element {}: No floor types available — load floor families".format(idx)
+                            floor_type = default_floor_type
+                            if not floor_type:
+                                errors.append(
+                                    "Element {}: No floor types available — load floor families".format(idx)
+                                )
+                                continue
+
+                        curve_loops = _CurveLoopList()
+                        curve_loops.Add(_build_curve_container(segments, DB.CurveLoop()))
+                        offset_feet = float(elem.get("offset", 0)) * MM_TO_FEET
+                        ready.append((idx, elem, element_type, level, floor_type, curve_loops, offset_feet))
+
+                    elif element_type == "roof":
+                        type_name = elem.get("type_name")
+                        roof_type = None
+                        if type_name:
+                            roof_type = roof_type_map.get(type_name)
+                            if not roof_type:
+                                errors.append(
+                                    "Element {}: Roof type '{}' not found. Available: {}".format(
+                                        idx, type_name, available_roof_types
                                     )
-                                    continue
-
-                            # Build curve loop
-                            curve_loop = DB.CurveLoop()
-                            for seg in boundary:
-                                p0 = seg.get("p0", {})
-                                p1 = seg.get("p1", {})
-                                s = DB.XYZ(
-                                    float(p0.get("x", 0)) / 304.8,
-                                    float(p0.get("y", 0)) / 304.8,
-                                    float(p0.get("z", 0)) / 304.8,
                                 )
-                                e = DB.XYZ(
-                                    float(p1.get("x", 0)) / 304.8,
-                                    float(p1.get("y", 0)) / 304.8,
-                                    float(p1.get("z", 0)) / 304.8,
+                                continue
+                        else:
+                            roof_type = default_roof_type
+                            if not roof_type:
+                                errors.append(
+                                    "Element {}: No roof types available — load roof families".format(idx)
                                 )
-                                curve_loop.Append(DB.Line.CreateBound(s, e))
+                                continue
 
-                            curve_loops = List[DB.CurveLoop]()
-                            curve_loops.Add(curve_loop)
+                        # CurveArray for the legacy NewFootPrintRoof API
+                        curve_array = _build_curve_container(segments, DB.CurveArray())
+                        ready.append((idx, elem, element_type, level, roof_type, curve_array, 0.0))
 
-                            floor = DB.Floor.Create(doc, curve_loops, floor_type.Id, level.Id)
+                except Exception as elem_err:
+                    errors.append("Element {}: {}".format(idx, str(elem_err)))
+                    continue
 
-                            # Apply offset if specified
-                            offset_mm = float(elem.get("offset", 0))
-                            if offset_mm != 0:
-                                offset_param = floor.get_Parameter(
-                                    DB.BuiltInParameter.FLOOR_HEIGHTABOVELEVEL_PARAM
-                                )
-                                if offset_param and not offset_param.IsReadOnly:
-                                    offset_param.Set(offset_mm / 304.8)
-
-                            created.append({
-                                "id": get_element_id_value(floor),
-                                "name": elem.get("name", ""),
-                                "type": get_element_name(floor_type),
-                                "level": get_element_name(level),
-                                "element_type": element_type,
-                            })
-
-                        elif element_type == "roof":
-                            type_name = elem.get("type_name")
-                            roof_type = None
-                            if type_name:
-                                roof_type = roof_type_map.get(type_name)
-                                if not roof_type:
-                                    available = ", ".join(sorted(roof_type_map.keys())[:10])
-                                    errors.append(
-                                        "Element {}: Roof type '{}' not found. Available: {}".format(
-                                            idx, type_name, available
-                                        )
-                                    )
-                                    continue
-                            else:
-                                if roof_type_map:
-                                    roof_type = list(roof_type_map.values())[0]
-                                else:
-                                    errors.append(
-                                        "Element {}: No roof types available — load roof families".format(idx)
-                                    )
-                                    continue
-
-                            # Build CurveArray for legacy NewFootPrintRoof API
-                            curve_array = DB.CurveArray()
-                            for seg in boundary:
-                                p0 = seg.get("p0", {})
-                                p1 = seg.get("p1", {})
-                                s = DB.XYZ(
-                                    float(p0.get("x", 0)) / 304.8,
-                                    float(p0.get("y", 0)) / 304.8,
-                                    float(p0.get("z", 0)) / 304.8,
-                                )
-                                e = DB.XYZ(
-                                    float(p1.get("x", 0)) / 304.8,
-                                    float(p1.get("y", 0)) / 304.8,
-                                    float(p1.get("z", 0)) / 304.8,
-                                )
-                                curve_array.Append(DB.Line.CreateBound(s, e))
+            # Pass 2: only the Revit create calls run inside the transaction
+            t = DB.Transaction(doc, "Create Surface-Based Elements")
+            t.Start()
 
+            try:
+                # Floor offsets are applied after all floors are created
+                pending_offsets = []
+                for idx, elem, element_type, level, surface_type, curves, offset_feet in ready:
+                    try:
+                        if element_type == "roof":
                             import clr
                             model_curves = clr.Reference[DB.ModelCurveArray]()
-                            roof = doc.Create.NewFootPrintRoof(
-                                curve_array, level, roof_type, model_curves
+                            new_elem = doc.Create.NewFootPrintRoof(
+                                curves, level, surface_type, model_curves
                             )
+                        else:
+                            new_elem = DB.Floor.Create(doc, curves, surface_type.Id, level.Id)
+                            if offset_feet != 0:
+                                pending_offsets.append((idx, new_elem, offset_feet))
 
-                            created.append({
-                                "id": get_element_id_value(roof),
-                                "name": elem.get("name", ""),
-                                "type": get_element_name(roof_type),
-                                "level": get_element_name(level),
-                                "element_type": "roof",
-                            })
+                        created.append({
+                            "id": get_element_id_value(new_elem),
+                            "name": elem.get("name", ""),
+                            "type": _element_name(doc, surface_type),
+                            "level": _element_name(doc, level),
+                            "element_type": element_type,
+                        })
 
                     except Exception as elem_err:
                         errors.append("Element {}: {}".format(idx, str(elem_err)))
                         continue
 
+                for idx, floor, offset_feet in pending_offsets:
+                    try:
+                        offset_param = floor.get_Parameter(_BIP_FLOOR_OFFSET)
+                        if offset_param and not offset_param.IsReadOnly:
+                            offset_param.Set(offset_feet)
+                    except Exception as offset_err:
+                        errors.append("Element {}: offset not applied: {}".format(idx, str(offset_err)))
+
                 t.Commit()
 
             except Exception as tx_err:
@@ -563,7 +706,7 @@ def register_building_routes(api):
                     status=503,
                 )
 
-            data = json.loads(request.data) if isinstance(request.data, str) else request.data
+            data = json_loads(request.data) if isinstance(request.data, str) else request.data
             levels = data.get("levels", [])
 
             if not levels:
@@ -575,28 +718,51 @@ def register_building_routes(api):
             created = []
             errors = []
 
+            # Drop repeated elevations (to 0.001 mm) and create in ascending order
+            to_create = []
+            seen = set()
+            for idx, lv in enumerate(levels):
+                try:
+                    elevation_mm = lv.get("elevation")
+                    if elevation_mm is None:
+                        errors.append("Level {}: elevation is required".format(idx))
+                        continue
+
+                    elevation_mm = float(elevation_mm)
+                    elevation_key = round(elevation_mm, 3)
+                    if elevation_key in seen:
+                        errors.append(
+                            "Level {}: duplicate elevation {} mm in this request — skipped".format(
+                                idx, elevation_mm
+                            )
+                        )
+                        continue
+                    seen.add(elevation_key)
+                    to_create.append((elevation_mm, idx, lv))
+
+                except Exception as lv_err:
+                    errors.append("Level {}: {}".format(idx, str(lv_err)))
+                    continue
+
+            to_create.sort(key=lambda item: item[0])
+
             t = DB.Transaction(doc, "Create Levels")
             t.Start()
 
             try:
-                for idx, lv in enumerate(levels):
+                for elevation_mm, idx, lv in to_create:
                     try:
-                        elevation_mm = lv.get("elevation")
-                        if elevation_mm is None:
-                            errors.append("Level {}: elevation is required".format(idx))
-                            continue
-
-                        elevation_feet = float(elevation_mm) / 304.8
-                        new_level = DB.Level.Create(doc, elevation_feet)
+                        new_level = DB.Level.Create(doc, elevation_mm * MM_TO_FEET)
 
                         name = lv.get("name")
                         if name:
                             new_level.Name = str(name)
 
                         created.append({
+                            "index": idx,
                             "id": get_element_id_value(new_level),
                             "name": get_element_name(new_level),
-                            "elevation_mm": float(elevation_mm),
+                            "elevation_mm": elevation_mm,
                         })
 
                     except Exception as lv_err:
@@ -613,6 +779,9 @@ def register_building_routes(api):
                     status=500,
                 )
 
+            # Report in request order; "index" maps each entry back to levels[i]
+            created.sort(key=lambda entry: entry["index"])
+
             response_data = {
                 "status": "success",
                 "created": created,
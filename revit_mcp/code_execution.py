@@ -4,15 +4,300 @@ Code Execution Module for Revit MCP
 Handles direct execution of IronPython code in Revit context.
 """
 from pyrevit import routes, revit, DB
+from collections import OrderedDict
+import __future__
 import json
 import logging
+import os
+import re
 import sys
 import traceback
-from StringIO import StringIO
 
 # Standard logger setup
 logger = logging.getLogger(__name__)
 
+# Include the snippet traceback in error responses; set MCP_INCLUDE_TRACEBACK=0
+# to leave it out (it is then only formatted when DEBUG logging is on)
+_INCLUDE_TRACEBACK = os.environ.get("MCP_INCLUDE_TRACEBACK", "1") != "0"
+
+# source string -> compiled code object, least recently used first
+_CODE_CACHE = OrderedDict()
+_CODE_CACHE_SIZE = 128
+
+
+class _OutputBuffer(object):
+    """stdout replacement that collects writes in a list and joins them once."""
+
+    def __init__(self):
+        self.chunks = []
+        self.write = self.chunks.append
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        return "".join(self.chunks)
+
+
+# Builtins kept when MCP_RESTRICTED_BUILTINS=1. Off by default: snippets
+# written against the full builtins (the tool docs show several) would break.
+_SAFE_BUILTIN_NAMES = (
+    "__import__", "abs", "all", "any", "bool", "dict", "dir", "enumerate",
+    "Exception", "filter", "float", "format", "frozenset", "getattr",
+    "hasattr", "int", "isinstance", "issubclass", "iter", "len", "list",
+    "map", "max", "min", "next", "object", "range", "repr", "reversed",
+    "round", "set", "setattr", "sorted", "str", "sum", "tuple", "type",
+    "unicode", "xrange", "zip", "True", "False", "None",
+    "AttributeError", "IndexError", "KeyError", "TypeError", "ValueError",
+)
+
+
+def _snippet_builtins():
+    """Return the builtins mapping snippets run with."""
+    builtins = __builtins__ if isinstance(__builtins__, dict) else vars(__builtins__)
+    if os.environ.get("MCP_RESTRICTED_BUILTINS") != "1":
+        return builtins
+    return dict(
+        (name, builtins[name]) for name in _SAFE_BUILTIN_NAMES if name in builtins
+    )
+
+
+# Names every snippet sees; copied per request, then doc and print are added
+_NS_TEMPLATE = {
+    "DB": DB,
+    "revit": revit,
+    "__builtins__": _snippet_builtins(),
+}
+
+
+def _make_print(write):
+    """print() replacement for snippets that sends its line to write."""
+    def _print(*args, **kwargs):
+        out = kwargs.get("file")
+        text = kwargs.get("sep", " ").join(str(arg) for arg in args) + kwargs.get("end", "\n")
+        if out is None:
+            write(text)
+        else:
+            out.write(text)
+    return _print
+
+
+# co_flags bit set on code compiled with "from __future__ import print_function"
+_PRINT_FUNCTION_FLAG = __future__.print_function.compiler_flag
+
+
+# Hints attached to common snippet failures
+_HINT_NAME = (
+    "The 'Name' property may not be directly accessible in IronPython. "
+    "Try using getattr(element, 'Name', 'N/A') or "
+    "element.get_Parameter(DB.BuiltInParameter.ALL_MODEL_TYPE_NAME).AsString()"
+)
+_HINT_ATTRIBUTE = (
+    "Some Revit API properties are not directly accessible in IronPython. "
+    "Try using getattr(obj, 'property_name', default_value) for safe access."
+)
+_HINT_NONE = (
+    "An object is None/null. Ensure you check if elements exist before "
+    "accessing their properties: 'if element:' or 'if element is not None:'"
+)
+_HINT_INVALID_OPERATION = (
+    "This operation may require being inside a transaction, or the element "
+    "may be in a state that doesn't allow this operation."
+)
+_HINT_TRANSACTION = (
+    "Transaction error. Note that this endpoint already wraps your code "
+    "in a transaction. Avoid starting nested transactions."
+)
+
+# Hint keywords looked for in the error message, found in one scan
+_HINT_RE = re.compile(r"(?P<name>Name)|(?P<none>NoneType)|(?P<txn>[Tt]ransaction)")
+
+
+def _error_hint(error_type, error_msg):
+    """Return the hint for a failed snippet, or None."""
+    found = set(m.lastgroup for m in _HINT_RE.finditer(error_msg))
+    if error_type == "AttributeError":
+        return _HINT_NAME if "name" in found else _HINT_ATTRIBUTE
+    if error_type == "NullReferenceException" or "none" in found:
+        return _HINT_NONE
+    if error_type == "InvalidOperationException":
+        return _HINT_INVALID_OPERATION
+    if "txn" in found:
+        return _HINT_TRANSACTION
+    return None
+
+
+def _compile_cached(source):
+    """Compile source for exec, reusing the code object of a repeated snippet."""
+    code_obj = _CODE_CACHE.pop(source, None)
+    if code_obj is None:
+        code_obj = compile(source, "<mcp>", "exec")
+        if len(_CODE_CACHE) >= _CODE_CACHE_SIZE:
+            _CODE_CACHE.popitem(last=False)
+    _CODE_CACHE[source] = code_obj
+    return code_obj
+
+
+# Snippets committed per outer transaction in batch execution
+BATCH_COMMIT_SIZE = 50
+
+
+def _error_result(exec_error, code_to_execute, partial_output):
+    """
+    Build the error payload for a failed snippet. Must be called from inside
+    the except block so the traceback is still available.
+    """
+    # Formatting walks every frame, so only do it when something will use it
+    error_traceback = None
+    if _INCLUDE_TRACEBACK or logger.isEnabledFor(logging.DEBUG):
+        error_traceback = traceback.format_exc()
+
+    # Build enhanced error message with hints
+    error_type = type(exec_error).__name__
+    error_msg = str(exec_error)
+    enhanced_message = "{}: {}".format(error_type, error_msg)
+
+    # Add a helpful hint for common errors
+    hints = []
+    hint = _error_hint(error_type, error_msg)
+    if hint:
+        hints.append(hint)
+
+    logger.error("Code execution failed: %s", enhanced_message)
+    logger.debug("Traceback: %s", error_traceback)
+
+    response_data = {
+        "status": "error",
+        "error": enhanced_message,
+        "error_type": error_type,
+        "code_attempted": code_to_execute,
+    }
+
+    if _INCLUDE_TRACEBACK:
+        response_data["traceback"] = error_traceback
+
+    if partial_output:
+        response_data["partial_output"] = partial_output
+
+    if hints:
+        response_data["hints"] = hints
+
+    return response_data
+
+
+def _run_snippet(doc, code_to_execute, description):
+    """
+    Exec one snippet with its output captured. The caller owns the
+    transaction. Returns (succeeded, response data).
+    """
+    captured_output = _OutputBuffer()
+    redirect = False
+
+    try:
+        code_obj = _compile_cached(code_to_execute)
+
+        # Snippets written with print_function only print through the
+        # namespace print(); print statements still write to sys.stdout, so
+        # only those snippets get the process-wide redirect
+        redirect = not (code_obj.co_flags & _PRINT_FUNCTION_FLAG)
+        if redirect:
+            old_stdout = sys.stdout
+            sys.stdout = captured_output
+
+        # Namespace with common Revit objects available
+        namespace = _NS_TEMPLATE.copy()
+        namespace["doc"] = doc
+        namespace["print"] = _make_print(captured_output.write)
+
+        # Execute the code, compiled once per distinct snippet
+        exec(code_obj, namespace)
+
+    except Exception as exec_error:
+        return False, _error_result(exec_error, code_to_execute, captured_output.getvalue())
+
+    finally:
+        if redirect:
+            sys.stdout = old_stdout
+
+    output = captured_output.getvalue()
+    return True, {
+        "status": "success",
+        "description": description,
+        "output": output if output else "Code executed successfully (no output)",
+        "code_executed": code_to_execute,
+    }
+
+
+def _execute_batch(doc, snippets):
+    """
+    Run a list of {"code", "description"} snippets under one transaction.
+    Each snippet gets a SubTransaction, so a failing snippet's changes are
+    rolled back without losing the others; the outer transaction is
+    committed every BATCH_COMMIT_SIZE successful snippets.
+    """
+    results = []
+    succeeded = 0
+    pending = 0
+
+    t = DB.Transaction(doc, "MCP Code Execution: batch of {}".format(len(snippets)))
+    t.Start()
+
+    try:
+        for idx, item in enumerate(snippets):
+            code_to_execute = item.get("code", "")
+            description = item.get("description", "Code execution")
+            if not code_to_execute:
+                results.append({"index": idx, "status": "error", "error": "No code provided"})
+                continue
+
+            logger.info("Executing code: %s", description)
+
+            st = DB.SubTransaction(doc)
+            st.Start()
+            try:
+                ok, result = _run_snippet(doc, code_to_execute, description)
+                if ok:
+                    st.Commit()
+            except Exception as sub_error:
+                ok, result = False, _error_result(sub_error, code_to_execute, "")
+            if not ok and st.HasStarted() and not st.HasEnded():
+                st.RollBack()
+
+            result["index"] = idx
+            results.append(result)
+            if ok:
+                succeeded += 1
+                pending += 1
+
+            if pending >= BATCH_COMMIT_SIZE:
+                t.Commit()
+                t = DB.Transaction(doc, "MCP Code Execution: batch of {}".format(len(snippets)))
+                t.Start()
+                pending = 0
+
+        t.Commit()
+
+    except Exception as tx_err:
+        if t.HasStarted() and not t.HasEnded():
+            t.RollBack()
+        return routes.make_response(
+            data={
+                "error": "Transaction failed: {}".format(str(tx_err)),
+                "results": results,
+            },
+            status=500,
+        )
+
+    return routes.make_response(
+        data={
+            "status": "success",
+            "results": results,
+            "count": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+        }
+    )
+
 
 def register_code_execution_routes(api):
     """Register code execution routes with the API."""
@@ -27,6 +312,11 @@ def register_code_execution_routes(api):
             "code": "python code as string",
             "description": "optional description of what the code does"
         }
+
+        or, to run several snippets under one transaction:
+        {
+            "batch": [{"code": "...", "description": "..."}, ...]
+        }
         """
         try:
             # Parse the request data
@@ -35,6 +325,15 @@ def register_code_execution_routes(api):
                 if isinstance(request.data, str)
                 else request.data
             )
+
+            snippets = data if isinstance(data, list) else data.get("batch")
+            if snippets is not None:
+                if not snippets:
+                    return routes.make_response(
+                        data={"error": "No code provided"}, status=400
+                    )
+                return _execute_batch(doc, snippets)
+
             code_to_execute = data.get("code", "")
             description = data.get("description", "Code execution")
 
@@ -43,129 +342,31 @@ def register_code_execution_routes(api):
                     data={"error": "No code provided"}, status=400
                 )
 
-            logger.info("Executing code: {}".format(description))
+            logger.info("Executing code: %s", description)
 
             # Create a transaction for any model modifications
             t = DB.Transaction(doc, "MCP Code Execution: {}".format(description))
             t.Start()
 
             try:
-                # Capture stdout to return any print statements
-                old_stdout = sys.stdout
-                captured_output = StringIO()
-                sys.stdout = captured_output
-
-                # Create a namespace with common Revit objects available
-                namespace = {
-                    "doc": doc,
-                    "DB": DB,
-                    "revit": revit,
-                    "__builtins__": __builtins__,
-                    "print": lambda *args: captured_output.write(
-                        " ".join(str(arg) for arg in args) + "\n"
-                    ),
-                }
-
-                # Execute the code
-                exec(code_to_execute, namespace)
-
-                # Restore stdout
-                sys.stdout = old_stdout
-
-                # Get any printed output
-                output = captured_output.getvalue()
-                captured_output.close()
-
-                # Commit the transaction
-                t.Commit()
-
-                return routes.make_response(
-                    data={
-                        "status": "success",
-                        "description": description,
-                        "output": (
-                            output
-                            if output
-                            else "Code executed successfully (no output)"
-                        ),
-                        "code_executed": code_to_execute,
-                    }
-                )
+                ok, response_data = _run_snippet(doc, code_to_execute, description)
+                if ok:
+                    t.Commit()
+                    return routes.make_response(data=response_data)
+            except Exception as commit_error:
+                response_data = _error_result(commit_error, code_to_execute, "")
 
-            except Exception as exec_error:
-                # Restore stdout if something went wrong
-                sys.stdout = old_stdout
-
-                # Capture any partial output before the error
-                partial_output = captured_output.getvalue()
-                captured_output.close()
-
-                # Rollback transaction if it's still active
-                if t.HasStarted() and not t.HasEnded():
-                    t.RollBack()
-
-                # Get the full traceback
-                error_traceback = traceback.format_exc()
-
-                # Build enhanced error message with hints
-                error_type = type(exec_error).__name__
-                error_msg = str(exec_error)
-                enhanced_message = "{}: {}".format(error_type, error_msg)
-
-                # Add helpful hints for common errors
-                hints = []
-                if error_type == "AttributeError":
-                    if error_msg == "Name" or "Name" in error_msg:
-                        hints.append(
-                            "The 'Name' property may not be directly accessible in IronPython. "
-                            "Try using getattr(element, 'Name', 'N/A') or "
-                            "element.get_Parameter(DB.BuiltInParameter.ALL_MODEL_TYPE_NAME).AsString()"
-                        )
-                    else:
-                        hints.append(
-                            "Some Revit API properties are not directly accessible in IronPython. "
-                            "Try using getattr(obj, 'property_name', default_value) for safe access."
-                        )
-                elif error_type == "NullReferenceException" or "NoneType" in error_msg:
-                    hints.append(
-                        "An object is None/null. Ensure you check if elements exist before "
-                        "accessing their properties: 'if element:' or 'if element is not None:'"
-                    )
-                elif error_type == "InvalidOperationException":
-                    hints.append(
-                        "This operation may require being inside a transaction, or the element "
-                        "may be in a state that doesn't allow this operation."
-                    )
-                elif "Transaction" in error_msg or "transaction" in error_msg:
-                    hints.append(
-                        "Transaction error. Note that this endpoint already wraps your code "
-                        "in a transaction. Avoid starting nested transactions."
-                    )
-
-                logger.error("Code execution failed: {}".format(enhanced_message))
-                logger.error("Traceback: {}".format(error_traceback))
-
-                response_data = {
-                    "status": "error",
-                    "error": enhanced_message,
-                    "error_type": error_type,
-                    "traceback": error_traceback,
-                    "code_attempted": code_to_execute,
-                }
+            # Rollback transaction if it's still active
+            if t.HasStarted() and not t.HasEnded():
+                t.RollBack()
 
-                if partial_output:
-                    response_data["partial_output"] = partial_output
-
-                if hints:
-                    response_data["hints"] = hints
-
-                return routes.make_response(
-                    data=response_data,
-                    status=500,
-                )
+            return routes.make_response(
+                data=response_data,
+                status=500,
+            )
 
         except Exception as e:
-            logger.error("Execute code request failed: {}".format(str(e)))
+            logger.error("Execute code request failed: %s", e)
             return routes.make_response(data={"error": str(e)}, status=500)
 
     logger.info("Code execution routes registered successfully.")
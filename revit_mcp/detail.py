@@ -4,7 +4,10 @@ Detail Module for Revit MCP
 Handles detail line creation for view-specific annotation
 """
 
-from utils import get_element_name, get_element_id_value
+from utils import (
+    get_element_name, get_element_id_value,
+    elements_valid, document_cache, register_document_cache,
+)
 from pyrevit import routes, revit, DB
 import json
 import traceback
@@ -14,6 +17,106 @@ logger = logging.getLogger(__name__)
 
 MM_TO_FEET = 1.0 / 304.8
 
+# View types that can host detail lines
+DETAIL_LINE_VIEW_TYPES = frozenset([
+    DB.ViewType.FloorPlan, DB.ViewType.CeilingPlan,
+    DB.ViewType.Section, DB.ViewType.Detail,
+    DB.ViewType.Elevation, DB.ViewType.DraftingView,
+    DB.ViewType.AreaPlan,
+])
+
+
+def _point_mm(point):
+    """
+    Return (x, y, z) floats from a {"x", "y", "z"} point in mm, missing axes
+    as 0, or None if the point is malformed.
+    """
+    try:
+        return (
+            float(point.get("x", 0)),
+            float(point.get("y", 0)),
+            float(point.get("z", 0)),
+        )
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _xyz_mm(coords, k=MM_TO_FEET):
+    """DB.XYZ in feet from an (x, y, z) tuple in mm returned by _point_mm."""
+    x, y, z = coords
+    return DB.XYZ(x * k, y * k, z * k)
+
+
+# Detail lines committed per outer transaction in batch creation
+BATCH_COMMIT_SIZE = 50
+
+
+# {view name: view ElementId} per document (see utils.document_cache),
+# evicted when a view is added or changed
+register_document_cache("views_by_name", DB.ElementClassFilter(DB.View))
+
+
+def _find_view(doc, view_name):
+    """Return the non-template view named view_name, or None."""
+    def build(d):
+        ids_by_name = {}
+        id_values = set()
+        views = (
+            DB.FilteredElementCollector(d)
+            .OfClass(DB.View)
+            .WhereElementIsNotElementType()
+        )
+        for v in views:
+            if v.IsTemplate:
+                continue
+            name = get_element_name(v)
+            if name not in ids_by_name:
+                ids_by_name[name] = v.Id
+                id_values.add(get_element_id_value(v))
+        return ids_by_name, id_values
+
+    view_id = document_cache(doc, "views_by_name", build).get(view_name)
+    return doc.GetElement(view_id) if view_id is not None else None
+
+
+# {line style name: projection GraphicsStyle} per document (see
+# utils.document_cache). Renaming or adding a line style changes its
+# GraphicsStyle, so graphics style and OST_Lines changes evict the entry.
+register_document_cache(
+    "line_styles",
+    DB.LogicalOrFilter(
+        DB.ElementCategoryFilter(DB.BuiltInCategory.OST_Lines),
+        DB.ElementClassFilter(DB.GraphicsStyle),
+    ),
+    lambda styles: elements_valid(styles.values()),
+)
+
+
+def _line_styles(doc):
+    """Return {line style name: projection GraphicsStyle} for the OST_Lines subcategories."""
+    def build(d):
+        styles = {}
+        try:
+            line_cat = d.Settings.Categories.get_Item(DB.BuiltInCategory.OST_Lines)
+        except Exception:
+            line_cat = None
+        if line_cat:
+            for sub_cat in line_cat.SubCategories:
+                try:
+                    graphics_style = sub_cat.GetGraphicsStyle(DB.GraphicsStyleType.Projection)
+                    if graphics_style is not None:
+                        styles[get_element_name(sub_cat)] = graphics_style
+                except Exception:
+                    continue
+        return styles, set(get_element_id_value(gs) for gs in styles.values())
+
+    return document_cache(doc, "line_styles", build)
+
+
+def _find_line_style(doc, style_name):
+    """Return the projection GraphicsStyle of the line style named style_name, or None."""
+    return _line_styles(doc).get(style_name)
+
 
 def register_detail_routes(api):
     """Register all detail routes with the API"""
@@ -37,20 +140,20 @@ def register_detail_routes(api):
                     status=400,
                 )
 
+            # Validate coordinates before any view or transaction work
+            start_mm = _point_mm(start_point)
+            end_mm = _point_mm(end_point)
+            if start_mm is None or end_mm is None:
+                return routes.make_response(
+                    data={"error": "start_point and end_point need numeric x, y, z values in mm"},
+                    status=400,
+                )
+
             # Find the view
             view_name = data.get("view_name")
             target_view = None
             if view_name:
-                views = (
-                    DB.FilteredElementCollector(doc)
-                    .OfClass(DB.View)
-                    .WhereElementIsNotElementType()
-                    .ToElements()
-                )
-                for v in views:
-                    if get_element_name(v) == view_name and not v.IsTemplate:
-                        target_view = v
-                        break
+                target_view = _find_view(doc, view_name)
                 if not target_view:
                     return routes.make_response(
                         data={"error": "View '{}' not found".format(view_name)},
@@ -60,34 +163,13 @@ def register_detail_routes(api):
                 target_view = doc.ActiveView
 
             # Check view type compatibility
-            try:
-                vt = target_view.ViewType
-                allowed_types = [
-                    DB.ViewType.FloorPlan, DB.ViewType.CeilingPlan,
-                    DB.ViewType.Section, DB.ViewType.Detail,
-                    DB.ViewType.Elevation, DB.ViewType.DraftingView,
-                    DB.ViewType.AreaPlan,
-                ]
-                if vt not in allowed_types:
-                    return routes.make_response(
-                        data={"error": "Cannot create detail line — the specified view is not a plan or detail view."},
-                        status=500,
-                    )
-            except Exception:
-                pass
-
-            start = DB.XYZ(
-                float(start_point.get("x", 0)) * MM_TO_FEET,
-                float(start_point.get("y", 0)) * MM_TO_FEET,
-                float(start_point.get("z", 0)) * MM_TO_FEET,
-            )
-            end = DB.XYZ(
-                float(end_point.get("x", 0)) * MM_TO_FEET,
-                float(end_point.get("y", 0)) * MM_TO_FEET,
-                float(end_point.get("z", 0)) * MM_TO_FEET,
-            )
+            if getattr(target_view, "ViewType", None) not in DETAIL_LINE_VIEW_TYPES:
+                return routes.make_response(
+                    data={"error": "Cannot create detail line — the specified view is not a plan or detail view."},
+                    status=500,
+                )
 
-            line = DB.Line.CreateBound(start, end)
+            line = DB.Line.CreateBound(_xyz_mm(start_mm), _xyz_mm(end_mm))
 
             t = DB.Transaction(doc, "Create Detail Line via MCP")
             t.Start()
@@ -106,24 +188,11 @@ def register_detail_routes(api):
                 line_style = data.get("line_style")
                 if line_style:
                     try:
-                        # Find the line style
-                        line_styles = detail_curve.GetLineStyleIds()
-                        cat = doc.Settings.Categories
-                        line_cat = None
-                        try:
-                            line_cat = cat.get_Item(DB.BuiltInCategory.OST_Lines)
-                        except Exception:
-                            pass
-
-                        if line_cat:
-                            for sub_cat in line_cat.SubCategories:
-                                if get_element_name(sub_cat) == line_style:
-                                    # Get the GraphicsStyle for this category
-                                    gs_id = sub_cat.GetGraphicsStyle(DB.GraphicsStyleType.Projection).Id
-                                    detail_curve.LineStyle = doc.GetElement(gs_id)
-                                    break
+                        graphics_style = _find_line_style(doc, line_style)
+                        if graphics_style:
+                            detail_curve.LineStyle = graphics_style
                     except Exception as style_err:
-                        logger.debug("Could not set line style: {}".format(str(style_err)))
+                        logger.debug("Could not set line style: %s", style_err)
 
                 t.Commit()
 
@@ -144,10 +213,150 @@ def register_detail_routes(api):
                 raise tx_error
 
         except Exception as e:
-            logger.error("Failed to create detail line: {}".format(str(e)))
+            logger.error("Failed to create detail line: %s", e)
             error_trace = traceback.format_exc()
             return routes.make_response(
                 data={"error": str(e), "traceback": error_trace}, status=500
             )
 
+    @api.route("/create_detail_lines/", methods=["POST"])
+    def create_detail_lines_handler(doc, request):
+        """
+        Create a batch of detail lines in one view.
+        Each line runs in its own SubTransaction so a bad line is rolled back
+        on its own; the outer transaction is committed every BATCH_COMMIT_SIZE lines.
+        """
+        try:
+            if not doc:
+                return routes.make_response(
+                    data={"error": "No active Revit document"}, status=503
+                )
+
+            data = json.loads(request.data) if isinstance(request.data, str) else request.data
+
+            lines = data.get("lines", [])
+            if not lines:
+                return routes.make_response(
+                    data={"error": "No lines provided — pass an array of line definitions"},
+                    status=400,
+                )
+
+            # Find the view once for the whole batch
+            view_name = data.get("view_name")
+            if view_name:
+                target_view = _find_view(doc, view_name)
+                if not target_view:
+                    return routes.make_response(
+                        data={"error": "View '{}' not found".format(view_name)},
+                        status=404,
+                    )
+            else:
+                target_view = doc.ActiveView
+
+            if getattr(target_view, "ViewType", None) not in DETAIL_LINE_VIEW_TYPES:
+                return routes.make_response(
+                    data={"error": "Cannot create detail lines — the specified view is not a plan or detail view."},
+                    status=500,
+                )
+
+            created = []
+            errors = []
+
+            # Build the lines before the transaction so only API calls run inside it
+            create_bound = DB.Line.CreateBound
+            prepared = []
+            for idx, item in enumerate(lines):
+                start_point = item.get("start_point")
+                end_point = item.get("end_point")
+                if not start_point or not end_point:
+                    errors.append("Line {}: start_point and end_point are required".format(idx))
+                    continue
+                start_mm = _point_mm(start_point)
+                end_mm = _point_mm(end_point)
+                if start_mm is None or end_mm is None:
+                    errors.append(
+                        "Line {}: start_point and end_point need numeric x, y, z values in mm".format(idx)
+                    )
+                    continue
+                try:
+                    line = create_bound(_xyz_mm(start_mm), _xyz_mm(end_mm))
+                except Exception as line_err:
+                    errors.append("Line {}: {}".format(idx, str(line_err)))
+                    continue
+                prepared.append((idx, line, item.get("line_style")))
+
+            t = DB.Transaction(doc, "Create Detail Lines via MCP")
+            t.Start()
+            pending = 0
+
+            new_detail_curve = doc.Create.NewDetailCurve
+
+            try:
+                for idx, line, line_style in prepared:
+                    st = DB.SubTransaction(doc)
+                    st.Start()
+                    try:
+                        detail_curve = new_detail_curve(target_view, line)
+
+                        if line_style:
+                            graphics_style = _find_line_style(doc, line_style)
+                            if graphics_style:
+                                detail_curve.LineStyle = graphics_style
+                            else:
+                                logger.debug("Line style '%s' not found", line_style)
+
+                        st.Commit()
+                    except Exception as line_err:
+                        if st.HasStarted() and not st.HasEnded():
+                            st.RollBack()
+                        errors.append("Line {}: {}".format(idx, str(line_err)))
+                        continue
+
+                    created.append({
+                        "index": idx,
+                        "line_id": get_element_id_value(detail_curve),
+                    })
+                    pending += 1
+
+                    if pending >= BATCH_COMMIT_SIZE:
+                        t.Commit()
+                        t = DB.Transaction(doc, "Create Detail Lines via MCP")
+                        t.Start()
+                        pending = 0
+
+                t.Commit()
+
+            except Exception as tx_err:
+                if t.HasStarted() and not t.HasEnded():
+                    t.RollBack()
+                # Lines from earlier committed chunks remain in the model
+                return routes.make_response(
+                    data={
+                        "error": "Transaction failed: {}".format(str(tx_err)),
+                        "created": created[:len(created) - pending],
+                    },
+                    status=500,
+                )
+
+            actual_view_name = get_element_name(target_view)
+            response_data = {
+                "status": "success",
+                "created": created,
+                "count": len(created),
+                "view_name": actual_view_name,
+                "message": "Created {} detail line(s) in view '{}'".format(
+                    len(created), actual_view_name
+                ),
+            }
+            if errors:
+                response_data["errors"] = errors
+
+            return routes.make_response(data=response_data)
+
+        except Exception as e:
+            logger.error("Failed to create detail lines: %s", e)
+            return routes.make_response(
+                data={"error": str(e), "traceback": traceback.format_exc()}, status=500
+            )
+
     logger.info("Detail routes registered successfully")
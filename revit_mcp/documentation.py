@@ -4,15 +4,193 @@ Documentation Module for Revit MCP
 Handles sheet creation, schedule creation, and document export
 """
 
-from utils import get_element_name, get_element_id_value
+from utils import (
+    get_element_name, get_element_id_value, json_loads, sanitize_string,
+    elements_valid, document_cache, drop_document_cache, register_document_cache,
+    BUILTIN_CATEGORIES,
+)
 from pyrevit import routes, revit, DB
-import json
-import traceback
+from System.Collections.Generic import List
+from collections import OrderedDict
 import logging
 import os
+import zlib
 
 logger = logging.getLogger(__name__)
 
+SUPPORTED_EXPORT_FORMATS = frozenset(["pdf", "png", "jpg", "dwg"])
+_ElementIdList = List[DB.ElementId]
+
+# Characters replaced with "_" in export file names
+_SAFE_NAME_TABLE = dict((ord(c), u"_") for c in u" /\\:")
+
+# BuiltInCategory name -> display name used in schedule responses
+_CATEGORY_DISPLAY = {}
+
+
+def _category_display(category_str):
+    """'OST_Walls' -> 'walls', memoised."""
+    display = _CATEGORY_DISPLAY.get(category_str)
+    if display is None:
+        display = _CATEGORY_DISPLAY[category_str] = category_str.replace("OST_", "").lower()
+    return display
+
+# Per-document caches (see utils.document_cache), evicted when a title block
+# or view is added or changed
+_TITLE_BLOCK_FILTER = DB.LogicalAndFilter(
+    DB.ElementClassFilter(DB.FamilySymbol),
+    DB.ElementCategoryFilter(DB.BuiltInCategory.OST_TitleBlocks),
+)
+register_document_cache(
+    "title_blocks", _TITLE_BLOCK_FILTER, lambda by_name: elements_valid(by_name.values())
+)
+register_document_cache("active_title_blocks", _TITLE_BLOCK_FILTER)
+# Views are checked for validity per lookup in _find_views instead
+register_document_cache("views", DB.ElementClassFilter(DB.View))
+
+
+def _fast_name(elem, bip):
+    """Read an element's name from its built-in name parameter, falling back to Name."""
+    p = elem.get_Parameter(bip)
+    if p is not None:
+        name = p.AsString()
+        if name:
+            return sanitize_string(name)
+    return get_element_name(elem)
+
+
+def _title_block_map(doc):
+    """Return {type name: title block FamilySymbol} in collector order."""
+    def build(d):
+        by_name = OrderedDict()
+        id_values = set()
+        collector = (
+            DB.FilteredElementCollector(d)
+            .OfCategory(DB.BuiltInCategory.OST_TitleBlocks)
+            .OfClass(DB.FamilySymbol)
+        )
+        for tb in collector:
+            try:
+                name = _fast_name(tb, DB.BuiltInParameter.SYMBOL_NAME_PARAM)
+            except Exception:
+                continue
+            if name not in by_name:
+                by_name[name] = tb
+            id_values.add(get_element_id_value(tb))
+        return by_name, id_values
+
+    return document_cache(doc, "title_blocks", build)
+
+
+def _active_title_blocks(doc):
+    """
+    Return the set of title block id values known to be active.
+    Any change to a title block evicts it, so membership is re-checked
+    against IsActive after activation or edits.
+    """
+    def build(d):
+        active = set()
+        return active, active
+
+    return document_cache(doc, "active_title_blocks", build)
+
+
+def _sheet_number_exists(doc, sheet_number):
+    """Check for a sheet with this number using a native parameter filter."""
+    param_id = DB.ElementId(DB.BuiltInParameter.SHEET_NUMBER)
+    try:
+        rule = DB.ParameterFilterRuleFactory.CreateEqualsRule(param_id, sheet_number)
+    except TypeError:
+        # Revit 2022 and earlier only have the caseSensitive overload
+        rule = DB.ParameterFilterRuleFactory.CreateEqualsRule(param_id, sheet_number, True)
+    dup = (
+        DB.FilteredElementCollector(doc)
+        .OfClass(DB.ViewSheet)
+        .WherePasses(DB.ElementParameterFilter(rule))
+        .FirstElement()
+    )
+    return dup is not None
+
+
+def _view_map(doc):
+    """Return {view name: view} for all views and sheets, first match wins."""
+    def build(d):
+        by_name = {}
+        id_values = set()
+        for v in DB.FilteredElementCollector(d).OfClass(DB.View):
+            try:
+                name = _fast_name(v, DB.BuiltInParameter.VIEW_NAME)
+            except Exception:
+                continue
+            if name not in by_name:
+                by_name[name] = v
+            id_values.add(get_element_id_value(v))
+        return by_name, id_values
+
+    return document_cache(doc, "views", build)
+
+
+def _find_views(doc, names):
+    """
+    Look names up in _view_map; None for names that are not found.
+    Rebuilds the map once if a cached view is no longer a valid object.
+    """
+    views_by_name = _view_map(doc)
+    found = [views_by_name.get(n) for n in names]
+    if any(v is not None and not v.IsValidObject for v in found):
+        drop_document_cache(doc, "views")
+        views_by_name = _view_map(doc)
+        found = [views_by_name.get(n) for n in names]
+    return found
+
+
+def _commit(t):
+    """Commit with warnings deferred and no modal failure dialogs."""
+    opts = t.GetFailureHandlingOptions()
+    opts.SetDelayedMiniWarnings(True)
+    opts.SetClearAfterRollback(True)
+    opts.SetForcedModalHandling(False)
+    return t.Commit(opts)
+
+
+_traceback = None
+
+
+def _format_exc():
+    """traceback.format_exc(), importing traceback on the first error only."""
+    global _traceback
+    if _traceback is None:
+        import traceback as _traceback_module
+        _traceback = _traceback_module
+    return _traceback.format_exc()
+
+
+def _unexpected_error_response(e, action):
+    """Log and return a 500 response for an unexpected error, with traceback."""
+    logger.error("Failed to %s: %s", action, e)
+    return routes.make_response(
+        data={"error": str(e), "traceback": _format_exc()}, status=500
+    )
+
+
+class _Tx(object):
+    """Transaction scope: starts on enter, rolls back on error, always disposes."""
+
+    def __init__(self, doc, name):
+        self.t = DB.Transaction(doc, name)
+
+    def __enter__(self):
+        self.t.Start()
+        return self.t
+
+    def __exit__(self, exc_type, exc_value, tb):
+        try:
+            if exc_type and self.t.GetStatus() == DB.TransactionStatus.Started:
+                self.t.RollBack()
+        finally:
+            self.t.Dispose()
+        return False
+
 
 def register_documentation_routes(api):
     """Register all documentation routes with the API"""
@@ -28,62 +206,42 @@ def register_documentation_routes(api):
 
             data = {}
             if request and request.data:
-                data = json.loads(request.data) if isinstance(request.data, str) else request.data
+                data = json_loads(request.data) if isinstance(request.data, str) else request.data
 
             sheet_number = data.get("sheet_number")
             sheet_name = data.get("sheet_name", "Unnamed Sheet")
             title_block_name = data.get("title_block_name")
 
             # Find title block
-            title_blocks = (
-                DB.FilteredElementCollector(doc)
-                .OfCategory(DB.BuiltInCategory.OST_TitleBlocks)
-                .OfClass(DB.FamilySymbol)
-                .ToElements()
-            )
+            title_blocks = _title_block_map(doc)
 
-            if not title_blocks or len(title_blocks) == 0:
+            if not title_blocks:
                 return routes.make_response(
                     data={"error": "No title block families found — load a title block family into the project"},
                     status=404,
                 )
 
+            # The map is keyed by title block name, so the name comes with the lookup
             target_tb = None
+            tb_name = title_block_name
             if title_block_name:
-                for tb in title_blocks:
-                    try:
-                        if get_element_name(tb) == title_block_name:
-                            target_tb = tb
-                            break
-                    except Exception:
-                        continue
+                target_tb = title_blocks.get(title_block_name)
 
             if not target_tb:
-                target_tb = title_blocks[0]
+                tb_name, target_tb = next(iter(title_blocks.items()))
 
             # Check for duplicate sheet number
-            if sheet_number:
-                existing_sheets = (
-                    DB.FilteredElementCollector(doc)
-                    .OfClass(DB.ViewSheet)
-                    .ToElements()
+            if sheet_number and _sheet_number_exists(doc, sheet_number):
+                return routes.make_response(
+                    data={"error": "Sheet number '{}' already exists in the project".format(sheet_number)},
+                    status=400,
                 )
-                for sheet in existing_sheets:
-                    try:
-                        if sheet.SheetNumber == sheet_number:
-                            return routes.make_response(
-                                data={"error": "Sheet number '{}' already exists in the project".format(sheet_number)},
-                                status=400,
-                            )
-                    except Exception:
-                        continue
 
-            t = DB.Transaction(doc, "Create Sheet via MCP")
-            t.Start()
+            tb_key = get_element_id_value(target_tb)
 
-            try:
+            with _Tx(doc, "Create Sheet via MCP") as t:
                 # Activate title block
-                if not target_tb.IsActive:
+                if tb_key not in _active_title_blocks(doc) and not target_tb.IsActive:
                     target_tb.Activate()
                     doc.Regenerate()
 
@@ -95,9 +253,8 @@ def register_documentation_routes(api):
                 if sheet_name:
                     new_sheet.Name = sheet_name
 
-                t.Commit()
-
-                tb_name = get_element_name(target_tb)
+                _commit(t)
+                _active_title_blocks(doc).add(tb_key)
 
                 return routes.make_response(
                     data={
@@ -114,17 +271,8 @@ def register_documentation_routes(api):
                     }
                 )
 
-            except Exception as tx_error:
-                if t.HasStarted() and not t.HasEnded():
-                    t.RollBack()
-                raise tx_error
-
         except Exception as e:
-            logger.error("Failed to create sheet: {}".format(str(e)))
-            error_trace = traceback.format_exc()
-            return routes.make_response(
-                data={"error": str(e), "traceback": error_trace}, status=500
-            )
+            return _unexpected_error_response(e, "create sheet")
 
     @api.route("/create_schedule/", methods=["POST"])
     def create_schedule_handler(doc, request):
@@ -140,7 +288,7 @@ def register_documentation_routes(api):
                     data={"error": "No data provided"}, status=400
                 )
 
-            data = json.loads(request.data) if isinstance(request.data, str) else request.data
+            data = json_loads(request.data) if isinstance(request.data, str) else request.data
 
             category_str = data.get("category")
             fields = data.get("fields")
@@ -152,9 +300,8 @@ def register_documentation_routes(api):
                 )
 
             # Resolve category
-            try:
-                bic = getattr(DB.BuiltInCategory, category_str)
-            except AttributeError:
+            bic = BUILTIN_CATEGORIES.get(category_str)
+            if bic is None:
                 return routes.make_response(
                     data={"error": "Invalid category '{}' — use a valid BuiltInCategory name like OST_Walls, OST_Rooms, OST_Doors".format(category_str)},
                     status=400,
@@ -163,10 +310,7 @@ def register_documentation_routes(api):
             # Get ElementId for category
             cat_id = DB.ElementId(bic)
 
-            t = DB.Transaction(doc, "Create Schedule via MCP")
-            t.Start()
-
-            try:
+            with _Tx(doc, "Create Schedule via MCP") as t:
                 # Create the schedule
                 schedule = DB.ViewSchedule.CreateSchedule(doc, cat_id)
 
@@ -184,20 +328,26 @@ def register_documentation_routes(api):
                 fields_added = []
                 fields_failed = []
 
+                sf_by_name = {}
                 if fields:
+                    # Name each schedulable field once, then look requested fields up
+                    for sf in schedulable_fields:
+                        try:
+                            name = sf.GetName(doc)
+                        except Exception:
+                            continue
+                        if name not in sf_by_name:
+                            sf_by_name[name] = sf
+
                     for field_name in fields:
-                        found = False
-                        for sf in schedulable_fields:
-                            try:
-                                if sf.GetName(doc) == field_name:
-                                    sched_def.AddField(sf)
-                                    fields_added.append(field_name)
-                                    found = True
-                                    break
-                            except Exception:
-                                continue
-
-                        if not found:
+                        sf = sf_by_name.get(field_name)
+                        if sf is None:
+                            fields_failed.append(field_name)
+                            continue
+                        try:
+                            sched_def.AddField(sf)
+                            fields_added.append(field_name)
+                        except Exception:
                             fields_failed.append(field_name)
                 else:
                     # Add first few available fields as defaults
@@ -222,10 +372,10 @@ def register_documentation_routes(api):
                 except Exception:
                     pass
 
-                t.Commit()
+                _commit(t)
 
                 # Get category display name
-                cat_display = category_str.replace("OST_", "").lower()
+                cat_display = _category_display(category_str)
 
                 result = {
                     "status": "success",
@@ -246,33 +396,17 @@ def register_documentation_routes(api):
                 }
 
                 if fields_failed:
-                    # Get available field names for error context
-                    available = []
-                    for sf in schedulable_fields:
-                        try:
-                            available.append(sf.GetName(doc))
-                        except Exception:
-                            continue
                     result["fields_not_found"] = fields_failed
-                    result["available_fields"] = sorted(available)[:30]
+                    result["available_fields"] = sorted(sf_by_name)[:30]
 
                 return routes.make_response(data=result)
 
-            except Exception as tx_error:
-                if t.HasStarted() and not t.HasEnded():
-                    t.RollBack()
-                raise tx_error
-
         except Exception as e:
-            logger.error("Failed to create schedule: {}".format(str(e)))
-            error_trace = traceback.format_exc()
-            return routes.make_response(
-                data={"error": str(e), "traceback": error_trace}, status=500
-            )
+            return _unexpected_error_response(e, "create schedule")
 
     @api.route("/export_document/", methods=["POST"])
     def export_document_handler(doc, request):
-        """Export a view or sheet to file."""
+        """Export a view or sheet (or a list of them) to file."""
         try:
             if not doc:
                 return routes.make_response(
@@ -281,50 +415,44 @@ def register_documentation_routes(api):
 
             data = {}
             if request and request.data:
-                data = json.loads(request.data) if isinstance(request.data, str) else request.data
+                data = json_loads(request.data) if isinstance(request.data, str) else request.data
 
             view_name = data.get("view_name")
             export_format = data.get("format", "pdf")
             resolution = data.get("resolution", 300)
 
-            supported_formats = ["pdf", "png", "jpg", "dwg"]
-            if export_format.lower() not in supported_formats:
+            if export_format.lower() not in SUPPORTED_EXPORT_FORMATS:
                 return routes.make_response(
                     data={"error": "Format '{}' not supported — use pdf, png, jpg, or dwg".format(export_format)},
                     status=400,
                 )
 
-            # Find the view
-            target_view = None
-            if view_name:
-                views = (
-                    DB.FilteredElementCollector(doc)
-                    .OfClass(DB.View)
-                    .ToElements()
-                )
-                for v in views:
-                    try:
-                        if get_element_name(v) == view_name:
-                            target_view = v
-                            break
-                    except Exception:
-                        continue
-
+            # Find the view(s)
+            view_names = data.get("view_names")
+            batch = isinstance(view_names, list) and len(view_names) > 0
+            if batch:
+                target_views = _find_views(doc, view_names)
+                missing = [n for n, v in zip(view_names, target_views) if v is None]
+                if missing:
+                    return routes.make_response(
+                        data={"error": "Views not found in the project: {}".format(", ".join(missing))},
+                        status=404,
+                    )
+            elif view_name:
+                target_view = _find_views(doc, [view_name])[0]
                 if not target_view:
                     return routes.make_response(
                         data={"error": "View '{}' not found in the project".format(view_name)},
                         status=404,
                     )
+                target_views = [target_view]
+            elif doc.ActiveView:
+                target_views = [doc.ActiveView]
             else:
-                target_view = doc.ActiveView
-
-            if not target_view:
                 return routes.make_response(
                     data={"error": "No view available for export"}, status=400
                 )
 
-            actual_view_name = get_element_name(target_view)
-
             # Determine export path
             export_dir = os.path.join(
                 os.environ.get("USERPROFILE", os.environ.get("HOME", "C:\\")),
@@ -335,62 +463,66 @@ def register_documentation_routes(api):
                 os.makedirs(export_dir)
 
             fmt = export_format.lower()
+            named_views = [(get_element_name(v), v) for v in target_views]
 
-            t = DB.Transaction(doc, "Export Document via MCP")
-            t.Start()
-
-            try:
-                file_path = ""
-                file_size_kb = 0
+            with _Tx(doc, "Export Document via MCP") as t:
+                # (view name, file path) per exported view
+                exported_files = []
 
                 if fmt == "png" or fmt == "jpg":
-                    # Image export
+                    # Image export — one options object reused for every view.
+                    # ExportImage names multi-view output itself, so views are
+                    # exported one at a time to keep each file path known.
                     options = DB.ImageExportOptions()
                     options.ZoomType = DB.ZoomFitType.FitToPage
                     options.PixelSize = resolution
                     options.ExportRange = DB.ExportRange.SetOfViews
 
-                    view_set = DB.ViewSet()
-                    view_set.Insert(target_view)
-
-                    # Use ICollection for SetViewsAndSheets
-                    from System.Collections.Generic import List
-                    view_ids = List[DB.ElementId]()
-                    view_ids.Add(target_view.Id)
-                    options.SetViewsAndSheets(view_ids)
-
                     if fmt == "png":
                         options.HLRandWFViewsFileType = DB.ImageFileType.PNG
                     else:
                         options.HLRandWFViewsFileType = DB.ImageFileType.JPGMedium
+                    expected_ext = ".png" if fmt == "png" else ".jpg"
 
-                    safe_name = actual_view_name.replace(" ", "_").replace("/", "_")
-                    options.FilePath = os.path.join(export_dir, safe_name)
-
-                    doc.ExportImage(options)
+                    for name, view in named_views:
+                        view_ids = _ElementIdList()
+                        view_ids.Add(view.Id)
+                        options.SetViewsAndSheets(view_ids)
 
-                    # Find the exported file
-                    expected_ext = ".png" if fmt == "png" else ".jpg"
-                    file_path = os.path.join(export_dir, safe_name + expected_ext)
+                        safe_name = name.translate(_SAFE_NAME_TABLE)
+                        options.FilePath = os.path.join(export_dir, safe_name)
+                        doc.ExportImage(options)
+                        exported_files.append(
+                            (name, os.path.join(export_dir, safe_name + expected_ext))
+                        )
 
                 elif fmt == "pdf":
-                    # PDF export (Revit 2022+)
+                    # PDF export (Revit 2022+) — all views go out in one Export call
                     try:
                         pdf_options = DB.PDFExportOptions()
-                        pdf_options.FileName = actual_view_name.replace(" ", "_")
+                        if batch:
+                            # Named after the view set, so different batches of
+                            # the same size do not overwrite each other
+                            view_set_key = zlib.crc32("\n".join(n for n, _ in named_views).encode("utf-8"))
+                            pdf_name = "{}_and_{}_more_{:08x}".format(
+                                named_views[0][0].translate(_SAFE_NAME_TABLE),
+                                len(named_views) - 1,
+                                view_set_key & 0xFFFFFFFF,
+                            )
+                        else:
+                            pdf_name = named_views[0][0].translate(_SAFE_NAME_TABLE)
+                        pdf_options.FileName = pdf_name
                         pdf_options.Combine = True
 
-                        from System.Collections.Generic import List
-                        view_ids = List[DB.ElementId]()
-                        view_ids.Add(target_view.Id)
+                        view_ids = _ElementIdList()
+                        for _, view in named_views:
+                            view_ids.Add(view.Id)
 
                         success = doc.Export(export_dir, view_ids, pdf_options)
 
                         if success:
-                            file_path = os.path.join(
-                                export_dir,
-                                actual_view_name.replace(" ", "_") + ".pdf"
-                            )
+                            pdf_path = os.path.join(export_dir, pdf_name + ".pdf")
+                            exported_files = [(name, pdf_path) for name, _ in named_views]
                         else:
                             # Fallback to image
                             t.RollBack()
@@ -410,17 +542,20 @@ def register_documentation_routes(api):
                         )
 
                 elif fmt == "dwg":
-                    # DWG export
+                    # DWG export — one file per view, sharing the options object;
+                    # a multi-view Export call would pick the file names itself
                     try:
                         dwg_options = DB.DWGExportOptions()
 
-                        from System.Collections.Generic import List
-                        view_ids = List[DB.ElementId]()
-                        view_ids.Add(target_view.Id)
+                        for name, view in named_views:
+                            view_ids = _ElementIdList()
+                            view_ids.Add(view.Id)
 
-                        safe_name = actual_view_name.replace(" ", "_")
-                        doc.Export(export_dir, safe_name, view_ids, dwg_options)
-                        file_path = os.path.join(export_dir, safe_name + ".dwg")
+                            safe_name = name.translate(_SAFE_NAME_TABLE)
+                            doc.Export(export_dir, safe_name, view_ids, dwg_options)
+                            exported_files.append(
+                                (name, os.path.join(export_dir, safe_name + ".dwg"))
+                            )
                     except Exception as dwg_err:
                         t.RollBack()
                         return routes.make_response(
@@ -428,40 +563,50 @@ def register_documentation_routes(api):
                             status=500,
                         )
 
-                t.Commit()
+                _commit(t)
 
-                # Get file size
-                try:
-                    if file_path and os.path.exists(file_path):
-                        file_size_kb = int(os.path.getsize(file_path) / 1024)
-                except Exception:
-                    pass
+                exported = []
+                # file path -> size in KB; a combined PDF is stat'ed once
+                sizes = {}
+                for name, file_path in exported_files:
+                    file_size_kb = sizes.get(file_path)
+                    if file_size_kb is None:
+                        try:
+                            file_size_kb = os.stat(file_path).st_size >> 10
+                        except (OSError, IOError):
+                            file_size_kb = 0
+                        sizes[file_path] = file_size_kb
+                    exported.append({
+                        "view_name": name,
+                        "format": fmt,
+                        "file_path": file_path,
+                        "file_size_kb": file_size_kb,
+                    })
+
+                if batch:
+                    return routes.make_response(
+                        data={
+                            "status": "success",
+                            "exported": exported,
+                            "count": len(exported),
+                            "message": "Exported {} views to {}".format(
+                                len(exported), fmt.upper()
+                            ),
+                        }
+                    )
 
+                result = exported[0]
                 return routes.make_response(
                     data={
                         "status": "success",
-                        "exported": {
-                            "view_name": actual_view_name,
-                            "format": fmt,
-                            "file_path": file_path,
-                            "file_size_kb": file_size_kb,
-                        },
+                        "exported": result,
                         "message": "Exported '{}' to {} ({} KB)".format(
-                            actual_view_name, fmt.upper(), file_size_kb
+                            result["view_name"], fmt.upper(), result["file_size_kb"]
                         ),
                     }
                 )
 
-            except Exception as tx_error:
-                if t.HasStarted() and not t.HasEnded():
-                    t.RollBack()
-                raise tx_error
-
         except Exception as e:
-            logger.error("Failed to export document: {}".format(str(e)))
-            error_trace = traceback.format_exc()
-            return routes.make_response(
-                data={"error": str(e), "traceback": error_trace}, status=500
-            )
+            return _unexpected_error_response(e, "export document")
 
     logger.info("Documentation routes registered successfully")
@@ -1,10 +1,24 @@
 # -*- coding: utf-8 -*-
 from pyrevit import DB
+import System
 import traceback
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Prefer a C JSON decoder when the host interpreter has one; IronPython falls back to json
+try:
+    from ujson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+# BuiltInCategory name -> enum value, resolved once instead of getattr per request
+BUILTIN_CATEGORIES = dict(
+    (name, getattr(DB.BuiltInCategory, name))
+    for name in dir(DB.BuiltInCategory)
+    if name.startswith("OST_")
+)
+
 
 def normalize_string(text):
     """Safely normalize string values to ASCII-safe output."""
@@ -111,3 +125,155 @@ def find_family_symbol_safely(doc, target_family_name, target_type_name=None):
     except Exception as e:
         logger.error("Error finding family symbol: %s", str(e))
         return None
+
+
+# (doc hash, cache kind, subkey) -> (value, set of element id values it was
+# built from). Shared by the route modules through document_cache(); entries
+# are evicted by _on_document_changed and purged when their document closes.
+_DOC_CACHE = {}
+
+# cache kind -> (change filter or None, validate callable or None)
+_DOC_CACHE_KINDS = {}
+
+# (has_entries, callback) pairs for caches kept outside _DOC_CACHE.
+# has_entries(doc hash) is a cheap check that the cache holds anything for
+# that document; callback(doc hash, touched) then gets the set of modified
+# or deleted element id values, or None when every entry for that document
+# must go (document closing, unreadable change event).
+_DOC_CHANGE_CALLBACKS = []
+
+# AppDomain slot holding [application, changed handler, closing handler] so a
+# reloaded engine can detach the handlers the previous engine attached
+_DOC_EVENTS_SLOT = "RevitMCP.DocumentCacheEvents"
+_doc_events_installed = False
+
+
+def register_document_cache(kind, change_filter=None, validate=None):
+    """
+    Register a document_cache() kind.
+    Entries are evicted when an element they were built from is modified or
+    deleted, or when an element passing change_filter is added or modified.
+    validate(value), if given, is checked on every cache hit; a False result
+    rebuilds the entry.
+    """
+    _DOC_CACHE_KINDS[kind] = (change_filter, validate)
+
+
+def register_document_change_callback(callback, has_entries):
+    """
+    Call callback(doc hash, touched id values or None) on document changes
+    for which has_entries(doc hash) is true.
+    """
+    _DOC_CHANGE_CALLBACKS.append((has_entries, callback))
+
+
+def elements_valid(elements):
+    """True if every Revit element in elements is still a valid object."""
+    return all(el.IsValidObject for el in elements)
+
+
+def _drop_document(doc_key):
+    for key in [k for k in _DOC_CACHE if k[0] == doc_key]:
+        _DOC_CACHE.pop(key, None)
+    _notify_callbacks(
+        doc_key, None, [cb for has_entries, cb in _DOC_CHANGE_CALLBACKS if has_entries(doc_key)]
+    )
+
+
+def _notify_callbacks(doc_key, touched, callbacks):
+    for callback in callbacks:
+        try:
+            callback(doc_key, touched)
+        except Exception as e:
+            logger.warning("Document cache callback failed: %s", e)
+
+
+def _on_document_changed(sender, args):
+    """
+    DocumentChanged handler: evict cache entries touched by the change.
+    Runs on every transaction in the session, so it returns before reading
+    any element ids unless something is cached for the changed document.
+    """
+    doc_key = args.GetDocument().GetHashCode()
+    keys = [k for k in _DOC_CACHE if k[0] == doc_key]
+    callbacks = [cb for has_entries, cb in _DOC_CHANGE_CALLBACKS if has_entries(doc_key)]
+    if not keys and not callbacks:
+        return
+    try:
+        touched = set(get_element_id_value(eid) for eid in args.GetDeletedElementIds())
+        touched.update(get_element_id_value(eid) for eid in args.GetModifiedElementIds())
+        for key in keys:
+            change_filter = _DOC_CACHE_KINDS[key[1]][0]
+            if not touched.isdisjoint(_DOC_CACHE[key][1]) or (
+                change_filter is not None
+                and (
+                    args.GetAddedElementIds(change_filter).Count > 0
+                    or args.GetModifiedElementIds(change_filter).Count > 0
+                )
+            ):
+                _DOC_CACHE.pop(key, None)
+    except Exception:
+        _drop_document(doc_key)
+        return
+    _notify_callbacks(doc_key, touched, callbacks)
+
+
+def _on_document_closing(sender, args):
+    """DocumentClosing handler: purge everything cached for the closing document."""
+    _drop_document(args.Document.GetHashCode())
+
+
+def ensure_document_listeners(doc):
+    """
+    Attach the shared DocumentChanged/DocumentClosing handlers once per engine,
+    detaching any left behind by a previous pyRevit engine first.
+    """
+    global _doc_events_installed
+    if _doc_events_installed:
+        return
+    app = doc.Application
+    domain = System.AppDomain.CurrentDomain
+    previous = domain.GetData(_DOC_EVENTS_SLOT)
+    if previous is not None:
+        try:
+            old_app, old_changed, old_closing = previous
+            old_app.DocumentChanged -= old_changed
+            old_app.DocumentClosing -= old_closing
+        except Exception as e:
+            logger.warning("Could not detach previous document handlers: %s", e)
+
+    changed = System.EventHandler[DB.Events.DocumentChangedEventArgs](_on_document_changed)
+    closing = System.EventHandler[DB.Events.DocumentClosingEventArgs](_on_document_closing)
+    app.DocumentChanged += changed
+    app.DocumentClosing += closing
+    domain.SetData(_DOC_EVENTS_SLOT, System.Array[System.Object]([app, changed, closing]))
+    _doc_events_installed = True
+
+
+def document_cache(doc, kind, build, subkey=None):
+    """
+    Return the cached value of kind for doc, building it with build(doc) on a
+    miss or when the kind's validate() rejects it. build returns
+    (value, set of element id values the value was built from).
+    """
+    ensure_document_listeners(doc)
+    key = (doc.GetHashCode(), kind, subkey)
+    entry = _DOC_CACHE.get(key)
+    if entry is not None:
+        validate = _DOC_CACHE_KINDS[kind][1]
+        if validate is None or validate(entry[0]):
+            return entry[0]
+    entry = build(doc)
+    _DOC_CACHE[key] = entry
+    return entry[0]
+
+
+def store_document_cache(doc, kind, value, id_values, subkey=None):
+    """Put a value built outside document_cache() into the cache."""
+    ensure_document_listeners(doc)
+    _DOC_CACHE[(doc.GetHashCode(), kind, subkey)] = (value, id_values)
+
+
+def drop_document_cache(doc, kind, subkey=None):
+    """Evict one cache entry, e.g. after finding a stale element in it."""
+    _DOC_CACHE.pop((doc.GetHashCode(), kind, subkey), None)
@@ -16,6 +16,7 @@ def register_analysis_tools(mcp, revit_get, revit_post, revit_image=None):
         visible_in_view: bool = False,
         bounding_box_min: dict = None,
         bounding_box_max: dict = None,
+        strict_bounding_box: bool = False,
         max_elements: int = 50,
         ctx: Context = None,
     ) -> str:
@@ -31,6 +32,8 @@ def register_analysis_tools(mcp, revit_get, revit_post, revit_image=None):
             visible_in_view: Only include elements visible in the active view (optional)
             bounding_box_min: Spatial filter min corner {"x", "y", "z"} in mm (optional)
             bounding_box_max: Spatial filter max corner {"x", "y", "z"} in mm (optional)
+            strict_bounding_box: Only match elements fully inside the bounding box
+                instead of intersecting it (defaults to False)
             max_elements: Maximum results to return (defaults to 50)
             ctx: MCP context for logging
         """
@@ -40,6 +43,7 @@ def register_analysis_tools(mcp, revit_get, revit_post, revit_image=None):
             "visible_in_view": visible_in_view,
             "bounding_box_min": bounding_box_min,
             "bounding_box_max": bounding_box_max,
+            "strict_bounding_box": strict_bounding_box,
             "max_elements": max_elements,
         }
         response = await revit_post("/ai_filter/", data, ctx)
@@ -93,3 +93,33 @@ def register_code_execution_tools(mcp, revit_get, revit_post, revit_image=None):
             if ctx:
                 await ctx.error(error_msg)
             return error_msg
+
+    @mcp.tool()
+    async def execute_revit_code_batch(snippets: list[dict], ctx: Context = None) -> str:
+        """
+        Execute several IronPython snippets in Revit under one transaction.
+
+        Use this instead of repeated execute_revit_code calls when running many
+        related snippets. Each snippet runs in the same context as
+        execute_revit_code, in its own sub-transaction, so a failing snippet
+        is rolled back and reported without undoing the others.
+
+        Args:
+            snippets: List of {"code": str, "description": str} entries
+            ctx: MCP context for logging
+
+        Returns:
+            Per-snippet results in the same shape as execute_revit_code, in order
+        """
+        try:
+            if ctx:
+                await ctx.info("Executing batch of {} snippet(s)".format(len(snippets)))
+
+            response = await revit_post("/execute_code/", {"batch": snippets}, ctx)
+            return format_response(response)
+
+        except (ConnectionError, ValueError, RuntimeError) as e:
+            error_msg = "Error during batch code execution: {}".format(str(e))
+            if ctx:
+                await ctx.error(error_msg)
+            return error_msg
@@ -37,3 +37,27 @@ def register_detail_tools(mcp, revit_get, revit_post, revit_image=None):
             data["line_style"] = line_style
         response = await revit_post("/create_detail_line/", data, ctx)
         return format_response(response)
+
+    @mcp.tool()
+    async def create_detail_lines(
+        lines: list[dict],
+        view_name: str = None,
+        ctx: Context = None,
+    ) -> str:
+        """Create many detail lines in one Revit view in a single call.
+
+        Use this instead of repeated create_detail_line calls when drawing
+        more than a handful of lines. Each line is created independently, so
+        an invalid line is reported in "errors" without affecting the rest.
+
+        Args:
+            lines: List of line definitions, each with "start_point" and
+                "end_point" ({"x", "y", "z"} in mm) and an optional "line_style"
+            view_name: Target view name (defaults to active view)
+            ctx: MCP context for logging
+        """
+        data = {"lines": lines}
+        if view_name is not None:
+            data["view_name"] = view_name
+        response = await revit_post("/create_detail_lines/", data, ctx)
+        return format_response(response)
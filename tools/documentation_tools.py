@@ -69,17 +69,22 @@ def register_documentation_tools(mcp, revit_get, revit_post, revit_image=None):
         view_name: str = None,
         format: str = "pdf",
         resolution: int = 300,
+        view_names: list[str] = None,
         ctx: Context = None,
     ) -> str:
         """Export a Revit view or sheet to PDF or image format.
 
         Exports the specified view (or the active view if none specified) to a
-        file on disk. Supported formats: PDF, PNG, JPG, DWG.
+        file on disk. Supported formats: PDF, PNG, JPG, DWG. Pass view_names to
+        export several views in one request; PDF output is combined into a
+        single file.
 
         Args:
             view_name: Name of the view or sheet to export (optional, uses active view)
             format: Output format — "pdf", "png", "jpg", or "dwg" (defaults to "pdf")
             resolution: DPI for image formats (defaults to 300, ignored for PDF/DWG)
+            view_names: List of view or sheet names to export together (optional,
+                takes precedence over view_name)
             ctx: MCP context for logging
         """
         data = {
@@ -87,5 +92,7 @@ def register_documentation_tools(mcp, revit_get, revit_post, revit_image=None):
             "format": format,
             "resolution": resolution,
         }
+        if view_names:
+            data["view_names"] = view_names
         response = await revit_post("/export_document/", data, ctx)
         return format_response(response)